@@ -18,6 +18,7 @@ Example:
 from __future__ import annotations
 
 import concurrent.futures
+import functools
 import os
 import re
 import sys
@@ -73,13 +74,25 @@ def run_git_command(
     Returns:
         Tuple[str, str, int]: stdout, stderr, and return code.
     """
+    return _get_git_handler(timeout).run_command(command, timeout)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_git_handler(timeout: int | None) -> SecureSubprocess:
+    """Return the SecureSubprocess shared by git commands with this timeout.
+
+    Args:
+        timeout: Maximum time in seconds to wait for the process to complete.
+
+    Returns:
+        SecureSubprocess: A handler that only allows git to run.
+    """
     config = SubprocessConfig(
         timeout=timeout,
         allowed_commands={"git"},  # Allow git command
         restricted_env=False,  # Use full environment for git commands
     )
-    handler = SecureSubprocess(config)
-    return handler.run_command(command, timeout)
+    return SecureSubprocess(config)
 
 
 def get_root_git_workspace() -> Path:
@@ -31,17 +31,30 @@ Note:
 
 from __future__ import annotations
 
+import codecs
 import contextlib
+import functools
+import heapq
+import io
+import itertools
 import logging
+import math
 import os
 import re
+import select
+import selectors
+import shutil
+import signal
 import subprocess
 import sys
+import threading
 import time
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Mapping
 from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
 from typing import (
+    IO,
     Any,
     Literal,
     NoReturn,
@@ -62,6 +75,19 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
+# resource.prlimit (Linux only) lets the kernel cap a child's CPU time
+try:
+    import resource
+
+    PRLIMIT_AVAILABLE = hasattr(resource, "prlimit")
+except ImportError:
+    PRLIMIT_AVAILABLE = False
+
+# os.pidfd_open (Linux 5.3+) lets a wait wake as soon as the process exits
+PIDFD_AVAILABLE = hasattr(os, "pidfd_open")
+# signal.pidfd_send_signal (Linux 5.1+) signals the process a pidfd refers to
+PIDFD_SIGNAL_AVAILABLE = PIDFD_AVAILABLE and hasattr(signal, "pidfd_send_signal")
+
 __all__ = [
     "STATUS_TYPE",
     "FileChange",
@@ -84,8 +110,185 @@ T = TypeVar("T", str, bytes)
 
 STATUS_TYPE = Literal["M", "A", "D", "R", "??"]
 
+# Variables copied into a restricted subprocess environment, with the value
+# used when the variable is missing from os.environ.
+_ESSENTIAL_ENV_VARS: tuple[tuple[str, str], ...] = (
+    ("PATH", ""),
+    ("LANG", "en_US.UTF-8"),
+    ("LC_ALL", "en_US.UTF-8"),
+)
+_WIN32_ENV_VARS: tuple[tuple[str, str], ...] = (
+    ("SYSTEMROOT", "C:\\Windows"),
+    ("TEMP", ""),
+    ("TMP", ""),
+    ("PATHEXT", ".COM;.EXE;.BAT;.CMD"),
+    ("COMSPEC", "C:\\Windows\\system32\\cmd.exe"),
+)
 
-@dataclass
+# Characters stripped from command arguments by SecureSubprocess.sanitize_command
+_WIN32_DANGEROUS_CHARS = re.compile(r"[&|^<>()]")
+_POSIX_DANGEROUS_CHARS = re.compile(r"[;&|`$<>]")
+
+# Size of each read from a subprocess pipe when streaming its output
+_READ_CHUNK_SIZE = 64 * 1024
+
+# os.environ decoded into a dict, with the raw data it was decoded from
+_ENVIRON_CACHE: tuple[dict[Any, Any], dict[str, str]] | None = None
+
+# psutil.Process objects shared by the monitor and termination code, keyed by pid
+_PS_PROCESS_CACHE: dict[int, psutil.Process] = {}
+_PS_PROCESS_CACHE_LOCK = threading.Lock()
+
+
+def _copy_environ() -> dict[str, str]:
+    """Return a copy of os.environ, decoding it again only after it changes.
+
+    os.environ.copy() decodes every variable in Python code. The decoded dict
+    is reused while os.environ's raw data still compares equal, a check that
+    runs in C and short-circuits on the objects an unchanged environment keeps.
+    """
+    global _ENVIRON_CACHE  # noqa: PLW0603
+    data = getattr(os.environ, "_data", None)
+    if data is None:
+        return os.environ.copy()
+
+    cached = _ENVIRON_CACHE
+    if cached is None or cached[0] != data:
+        cached = _ENVIRON_CACHE = (dict(data), os.environ.copy())
+    return cached[1].copy()
+
+
+def _get_ps_process(pid: int) -> psutil.Process:
+    """Return a cached psutil.Process for pid, creating it if needed.
+
+    Cached entries whose process is no longer running are replaced, so a
+    reused pid never resolves to a stale object.
+    """
+    with _PS_PROCESS_CACHE_LOCK:
+        proc = _PS_PROCESS_CACHE.get(pid)
+        if proc is None or not proc.is_running():
+            proc = psutil.Process(pid)
+            _PS_PROCESS_CACHE[pid] = proc
+        return proc
+
+
+def _evict_ps_process(pid: int | None) -> None:
+    """Drop the cached psutil.Process for pid, if any."""
+    if pid is None:
+        return
+    with _PS_PROCESS_CACHE_LOCK:
+        _PS_PROCESS_CACHE.pop(pid, None)
+
+
+def _open_pidfd(process: subprocess.Popen[Any]) -> int | None:
+    """Open a pidfd for process, which the caller must close.
+
+    Returns:
+        int | None: The pidfd, or None if pidfds are unavailable or the process
+            has already been reaped.
+    """
+    # A reaped pid may already belong to another process, so never open it
+    if not PIDFD_AVAILABLE or process.returncode is not None:
+        return None
+    try:
+        return os.pidfd_open(process.pid)
+    except OSError:
+        return None  # Kernel without pidfd support
+
+
+def _poll_pidfd(pidfd: int, timeout: float | None) -> None:
+    """Block until the process behind pidfd exits or timeout seconds pass."""
+    poller = select.poll()
+    poller.register(pidfd, select.POLLIN)
+    poller.poll(None if timeout is None else timeout * 1000)
+
+
+def _terminate_via_pidfd(process: subprocess.Popen[Any], timeout: float) -> bool:
+    """Send SIGTERM, then SIGKILL if it is still running, through a pidfd.
+
+    A pidfd keeps referring to the process it was opened for, so the signals
+    can never reach another process that reused the pid. The same fd is polled
+    for the exit in between.
+
+    Returns:
+        bool: True if the process was signalled, False if no pidfd could be
+            opened and Popen.terminate should be used instead.
+    """
+    pidfd = _open_pidfd(process)
+    if pidfd is None:
+        return False
+
+    try:
+        signal.pidfd_send_signal(pidfd, signal.SIGTERM)
+        _poll_pidfd(pidfd, timeout)
+        if process.poll() is None:
+            signal.pidfd_send_signal(pidfd, signal.SIGKILL)
+    finally:
+        os.close(pidfd)
+    return True
+
+
+def _wait_for_exit(
+    process: subprocess.Popen[Any], timeout: float | None, pidfd: int | None = None
+) -> bool:
+    """Wait up to timeout seconds for process to exit, reaping it if it does.
+
+    Where pidfds are available the wait blocks on the process's pidfd, so it
+    returns as soon as the process exits rather than on Popen.wait's polling
+    schedule. Elsewhere, or if the pidfd cannot be opened, Popen.wait is used.
+
+    Args:
+        process: The process to wait for.
+        timeout: Seconds to wait, or None to wait until it exits.
+        pidfd: A pidfd already open for process, for callers that wait on it
+            repeatedly. Otherwise one is opened and closed for this call.
+
+    Returns:
+        bool: True if the process has exited, False if it is still running.
+    """
+    if process.returncode is not None:
+        return True
+
+    owned = pidfd is None
+    if owned:
+        pidfd = _open_pidfd(process)
+    if pidfd is not None:
+        try:
+            _poll_pidfd(pidfd, timeout)
+        finally:
+            if owned:
+                os.close(pidfd)
+        return process.poll() is not None
+
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=256)
+def _not_allowed_message(executable: str) -> str:
+    """Return the error message for a command that is not allowed.
+
+    Only the message is cached: each denial still raises a fresh ValueError,
+    since re-raising one instance would keep growing its traceback.
+    """
+    return f"Command not allowed: {executable}"
+
+
+@functools.lru_cache(maxsize=128)
+def _base_command(executable: str, platform: str) -> str:
+    """Return the name checked against allowed_commands for an executable.
+
+    The directory is dropped and, on Windows, so is the extension, since
+    executables there are usually invoked with one (.exe, .bat, etc.).
+    """
+    path = Path(executable)
+    return path.stem if platform == "win32" else path.name
+
+
+@dataclass(slots=True)
 class FileChange:
     path: Path
     status: STATUS_TYPE
@@ -95,10 +298,14 @@ class FileChange:
     last_modified: float = 0.0
 
     def __post_init__(self) -> None:
-        self.diff_lines = len(self.diff.strip().splitlines())
-        self.last_modified = (
-            Path(self.path).stat().st_mtime if Path(self.path).exists() else 0.0
-        )
+        # Count separators instead of materialising a list of lines
+        diff = self.diff.strip()
+        self.diff_lines = diff.count("\n") + 1 if diff else 0
+        # A single stat gives both existence and mtime
+        try:
+            self.last_modified = Path(self.path).stat().st_mtime
+        except (OSError, ValueError):
+            self.last_modified = 0.0
 
 
 @dataclass
@@ -129,6 +336,8 @@ class SubprocessHandler:
         timeout: int | None = None,
         max_termination_retries: int | None = None,
         termination_wait: float | None = None,
+        new_process_group: bool = False,
+        use_posix_spawn: bool = False,
     ) -> None:
         """Initialize the SubprocessHandler with configurable timeout and termination settings.
 
@@ -136,11 +345,18 @@ class SubprocessHandler:
             timeout: Maximum time in seconds to wait for a process to complete.
             max_termination_retries: Maximum number of attempts to terminate a process.
             termination_wait: Time to wait between termination attempts in seconds.
+            new_process_group: Run each process in its own session (POSIX only)
+                and terminate it as a group, so grandchildren die with it.
+            use_posix_spawn: Start processes with posix_spawn where CPython
+                allows it. This needs close_fds=False, so the child inherits
+                every inheritable file descriptor of this process.
         """
         self.process: subprocess.Popen[Any] | None = None
         self.timeout: int = timeout or 30
         self.max_termination_retries: int = max_termination_retries or 3
         self.termination_wait: float = termination_wait or 0.5
+        self.new_process_group: bool = new_process_group and sys.platform != "win32"
+        self.use_posix_spawn: bool = use_posix_spawn
 
     def create_env(self) -> dict[str, str]:
         """Create environment with explicit encoding settings for subprocess.
@@ -148,7 +364,7 @@ class SubprocessHandler:
         Returns:
             Dict[str, str]: Environment variables dictionary with encoding settings.
         """
-        env = os.environ.copy()
+        env = _copy_environ()
         env["PYTHONIOENCODING"] = "utf-8"
         return env
 
@@ -169,7 +385,12 @@ class SubprocessHandler:
                 process,
             )
         except subprocess.TimeoutExpired:
-            self._handle_timeout(process, params.command, params.timeout)
+            # communicate() does not kill on timeout; kill once here so the
+            # timeout handler does not run a second terminate/poll cycle.
+            self._kill_timed_out_process(process)
+            self._handle_timeout(
+                process, params.command, params.timeout, already_dead=True
+            )
         except Exception as e:
             self._handle_execution_error(process, e)
         finally:
@@ -180,7 +401,52 @@ class SubprocessHandler:
         self, command: list[str], popen_kwargs: dict[str, Any]
     ) -> subprocess.Popen[Any]:
         """Start a subprocess with the given command and parameters."""
-        return subprocess.Popen(command, **popen_kwargs)
+        if self.new_process_group:
+            # Lead a new session, whose process group can be signalled as one
+            popen_kwargs["start_new_session"] = True
+        return subprocess.Popen(command, **self._add_spawn_args(command, popen_kwargs))
+
+    def _add_spawn_args(
+        self, command: list[str], popen_kwargs: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Let Popen start the process with posix_spawn if use_posix_spawn is set.
+
+        CPython only uses posix_spawn, which does not copy the parent's page
+        tables the way fork does, when the executable path has a directory,
+        close_fds is False, and there is no cwd or new session. With
+        close_fds=False the child inherits every inheritable descriptor: PEP 446
+        only covers descriptors Python opens itself, not those opened by C
+        extensions without O_CLOEXEC or made inheritable on purpose. That is
+        why the fast path is opt-in.
+
+        Args:
+            command: Command to execute as a list of strings.
+            popen_kwargs: Keyword arguments for subprocess.Popen.
+
+        Returns:
+            Dict[str, Any]: popen_kwargs, extended when posix_spawn can be used.
+        """
+        if (
+            not self.use_posix_spawn
+            or not getattr(subprocess, "_USE_POSIX_SPAWN", False)
+            or popen_kwargs.get("shell")
+            or popen_kwargs.get("start_new_session")
+            or "cwd" in popen_kwargs
+        ):
+            return popen_kwargs
+
+        executable = command[0]
+        # Compare against the name rather than parent: Path drops a leading
+        # "./", and such paths must not be looked up on PATH
+        if Path(executable).name == executable:
+            env = popen_kwargs.get("env") or os.environ
+            resolved = shutil.which(executable, path=env.get("PATH"))
+            if resolved is None:
+                # Leave it to Popen to report the missing command
+                return popen_kwargs
+            executable = resolved
+
+        return {**popen_kwargs, "executable": executable, "close_fds": False}
 
     def _communicate_with_process(
         self, process: subprocess.Popen[Any], timeout: int | None
@@ -220,12 +486,36 @@ class SubprocessHandler:
         process: subprocess.Popen[Any] | None,
         command: list[str],
         timeout: int | None,
+        already_dead: bool = False,
     ) -> None:
-        """Handle a timeout scenario."""
-        self._terminate_process(process)
+        """Handle a timeout scenario.
+
+        Args:
+            process: The timed out subprocess.Popen object.
+            command: The command that timed out.
+            timeout: The timeout that was exceeded.
+            already_dead: Whether the process has already been killed.
+        """
+        if not already_dead:
+            self._terminate_process(process)
         e = f"Command timed out after {timeout or self.timeout} seconds: {' '.join(command)}"
         raise TimeoutError(e)
 
+    def _kill_timed_out_process(self, process: subprocess.Popen[Any] | None) -> None:
+        """Kill a timed out process, and its group if it leads one, then wait briefly.
+
+        Args:
+            process: The subprocess.Popen object to kill.
+        """
+        if process is None:
+            return
+        if self.new_process_group and process.pid is not None:
+            with contextlib.suppress(OSError):
+                os.killpg(process.pid, signal.SIGKILL)
+        with contextlib.suppress(OSError):
+            process.kill()
+        _wait_for_exit(process, self.termination_wait)
+
     def _handle_execution_error(
         self,
         process: subprocess.Popen[Any] | None,
@@ -318,15 +608,45 @@ class SubprocessHandler:
         Returns:
             Tuple[str, str, int]: stdout, stderr, and return code.
         """
-        # Set default encoding to UTF-8 with error handling for Windows compatibility
-        encoding = "utf-8"
-        errors = "replace"  # Replace invalid chars with a replacement marker
+        # Set default encoding to UTF-8 with error handling for Windows compatibility.
+        # Invalid bytes become a replacement marker, so decoding cannot fail and
+        # the command never needs to be run a second time in binary mode.
+        return self.run_text_mode(command, "utf-8", "replace", timeout)
 
-        try:
-            return self.run_text_mode(command, encoding, errors, timeout)
-        except UnicodeDecodeError:
-            # Fall back to binary mode and manual decoding if text mode fails
-            return self.run_binary_mode(command, encoding, errors, timeout)
+    def run_command_for_status(
+        self, command: list[str], timeout: int | None = None
+    ) -> int:
+        """Execute a command for its return code only, discarding its output.
+
+        Output goes straight to the null device, so no pipes are created and
+        nothing is read back into Python.
+
+        Args:
+            command: Command to execute as a list of strings.
+            timeout: Maximum time in seconds to wait for the process to complete.
+
+        Returns:
+            int: The return code of the command.
+
+        Raises:
+            TimeoutError: If the process exceeds the specified timeout.
+        """
+        popen_kwargs = {
+            "stdout": subprocess.DEVNULL,
+            "stderr": subprocess.DEVNULL,
+            "env": self.create_env(),
+        }
+
+        params = SubprocessExecutionParams(
+            command=command,
+            popen_kwargs=popen_kwargs,
+            timeout=timeout,
+            is_text_mode=False,
+            encoding="utf-8",
+            errors="replace",
+        )
+
+        return self._execute_subprocess(params)[2]
 
     def _terminate_process(self, process: subprocess.Popen[Any] | None) -> None:
         """Terminate a process with multiple attempts if needed.
@@ -337,23 +657,53 @@ class SubprocessHandler:
         if process is None or process.poll() is not None:
             return
 
+        if self.new_process_group and self._terminate_process_group(process):
+            return
+
         # Try to terminate the process gracefully
+        timeout = self.max_termination_retries * self.termination_wait
         try:
-            process.terminate()
+            if PIDFD_SIGNAL_AVAILABLE and _terminate_via_pidfd(process, timeout):
+                return
 
-            # Wait for the process to terminate
-            for _ in range(self.max_termination_retries):
-                if process.poll() is not None:
-                    return
-                time.sleep(self.termination_wait)
+            process.terminate()
 
-            # If still running, kill it forcefully
-            if process.poll() is None:
+            # Wait for the process to terminate within the whole retry budget
+            if not _wait_for_exit(process, timeout):
+                # If still running, kill it forcefully
                 process.kill()
         except OSError:
             # Process might already be gone
             pass
 
+    def _terminate_process_group(self, process: subprocess.Popen[Any] | None) -> bool:
+        """Terminate the process group led by a still running process.
+
+        The group is sent SIGTERM, the leader is waited on, and whatever is
+        left of the group is then sent SIGKILL. This takes a single signal per
+        step for the whole tree instead of walking it with psutil.
+
+        Args:
+            process: The subprocess.Popen object leading the group.
+
+        Returns:
+            bool: True if the group was signalled, False to fall back to the
+                standard termination.
+        """
+        if process is None or process.pid is None or process.poll() is not None:
+            return False
+
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            return False
+
+        _wait_for_exit(process, self.max_termination_retries * self.termination_wait)
+        with contextlib.suppress(OSError):
+            # Members that ignored SIGTERM; ESRCH once the group is gone
+            os.killpg(process.pid, signal.SIGKILL)
+        return True
+
     def _cleanup_process(self, process: subprocess.Popen[Any] | None) -> None:
         """Clean up process resources to prevent memory leaks.
 
@@ -374,7 +724,15 @@ class SubprocessHandler:
 
 
 class ProcessResourceMonitor:
-    """Class for monitoring process resource usage."""
+    """Class for monitoring process resource usage.
+
+    Sampling follows a duty cycle: the process is sampled every
+    monitor_interval for a burst of burst_duration seconds, then left alone for
+    sampling_interval seconds before the next burst. A longer idle period means
+    proportionally fewer psutil calls, at the cost of noticing a limit
+    violation up to sampling_interval later. With no sampling_interval the
+    process is sampled continuously.
+    """
 
     def __init__(
         self,
@@ -383,20 +741,34 @@ class ProcessResourceMonitor:
         memory_limit: int | None,
         monitor_interval: float,
         terminate_callback: Callable,
+        *,
+        sampling_interval: float = 0.0,
+        burst_duration: float = 0.0,
     ) -> None:
         self.process = process
         self.cpu_limit = cpu_limit
         self.memory_limit = memory_limit
         self.monitor_interval = monitor_interval
         self.terminate_callback = terminate_callback
+        self.sampling_interval = sampling_interval
+        self.burst_duration = burst_duration
+        self._ps_process: psutil.Process | None = None
+        # cpu_percent(None) measures since the previous call on the same object,
+        # so child Process objects are kept from one sample to the next
+        self._children: dict[int, psutil.Process] = {}
+        self._burst_end: float | None = None
 
     def start_monitoring(self) -> None:
-        """Start monitoring the process resources."""
+        """Monitor the process resources until it exits, blocking the caller.
+
+        SecureSubprocess registers monitors with the shared scheduler instead,
+        which drives them through poll_once.
+        """
         if not PSUTIL_AVAILABLE or self.process is None or self.process.pid is None:
             return
 
         try:
-            p = psutil.Process(self.process.pid)
+            p = _get_ps_process(self.process.pid)
             self._monitor_process_tree(p)
         except (psutil.NoSuchProcess, psutil.AccessDenied, ProcessLookupError):
             # Process may have disappeared
@@ -404,39 +776,102 @@ class ProcessResourceMonitor:
         except Exception:
             logger.exception("Error monitoring process resources: ")
 
+    def poll_once(self) -> bool:
+        """Take a single resource sample of the process tree.
+
+        Returns:
+            bool: True if monitoring should continue, False otherwise.
+        """
+        try:
+            if self._ps_process is None:
+                # Availability only needs checking once, before the first sample
+                pid = None if self.process is None else self.process.pid
+                if not PSUTIL_AVAILABLE or pid is None:
+                    return False
+                self._ps_process = _get_ps_process(pid)
+            return self._sample(self._ps_process)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, ProcessLookupError):
+            # Process may have disappeared
+            return False
+        except Exception:
+            logger.exception("Error monitoring process resources: ")
+            return False
+
     def _monitor_process_tree(self, p: psutil.Process) -> None:
         """Monitor a process tree for resource usage.
 
         Args:
             p: The psutil.Process object for the subprocess.
         """
-        # Monitor child processes too
-        processes = [p]
-        children = []
+        # One pidfd serves every tick instead of being reopened per sample
+        pidfd = None if self.process is None else _open_pidfd(self.process)
+        try:
+            while self._sample(p):
+                # Wait out the interval on the process itself, so its exit ends
+                # monitoring at once instead of after the next sleep
+                delay = self.next_delay(time.monotonic())
+                if _wait_for_exit(self.process, delay, pidfd):
+                    return
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
 
-        while True:
-            if self.process.poll() is not None:
-                # Process has completed, no need to continue monitoring
-                break
+    def next_delay(self, now: float) -> float:
+        """Return how long to wait before the next sample.
 
-            try:
-                # Refresh the list of child processes
-                children = p.children(recursive=True)
-                processes = [p, *children]
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                # Process may have disappeared
-                break
+        Args:
+            now: The current time.monotonic() value.
 
-            if self._check_resource_limits(processes, p):
-                return
+        Returns:
+            float: monitor_interval within a burst, sampling_interval after one.
+        """
+        if self.sampling_interval <= 0:
+            return self.monitor_interval
+
+        if self._burst_end is None:
+            # The first burst starts with the first sample
+            self._burst_end = now + self.burst_duration
+        if now < self._burst_end:
+            return self.monitor_interval
+
+        self._burst_end = now + self.sampling_interval + self.burst_duration
+        return self.sampling_interval
 
-            time.sleep(self.monitor_interval)
+    def _sample(self, p: psutil.Process) -> bool:
+        """Check the process tree against the resource limits once.
+
+        Args:
+            p: The psutil.Process object for the subprocess.
+
+        Returns:
+            bool: True if the process is still running within its limits.
+        """
+        if self.process.poll() is not None:
+            # Process has completed, no need to continue monitoring
+            return False
+
+        try:
+            # Monitor child processes too
+            children = {}
+            for child in p.children(recursive=True):
+                known = self._children.get(child.pid)
+                children[child.pid] = known if known == child else child
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            # Process may have disappeared
+            return False
+
+        self._children = children
+        return not self._check_resource_limits([p, *children.values()], p)
 
     def _check_resource_limits(
         self, processes: list[psutil.Process], parent: psutil.Process
     ) -> bool:
         """Check if any process in the list exceeds resource limits.
 
+        Each process is read once inside psutil's oneshot(), so both limits
+        are checked from the same /proc snapshot, and only the metrics that
+        have a limit are read at all.
+
         Args:
             processes: List of psutil.Process objects to check.
             parent: The parent process to terminate if limits are exceeded.
@@ -446,58 +881,159 @@ class ProcessResourceMonitor:
         """
         for proc in processes:
             try:
-                if self._check_cpu_limit(proc, parent):
-                    return True
-
-                if self._check_memory_limit(proc, parent):
-                    return True
+                with proc.oneshot():
+                    cpu_percent = (
+                        proc.cpu_percent(None) if self.cpu_limit is not None else 0.0
+                    )
+                    rss = proc.memory_info().rss if self.memory_limit is not None else 0
             except (psutil.NoSuchProcess, psutil.AccessDenied):
                 # Process may have disappeared
                 continue
 
+            if self._check_cpu_limit(proc, parent, cpu_percent):
+                return True
+
+            if self._check_memory_limit(proc, parent, rss):
+                return True
+
         return False
 
-    def _check_cpu_limit(self, proc: psutil.Process, parent: psutil.Process) -> bool:
+    def _check_cpu_limit(
+        self, proc: psutil.Process, parent: psutil.Process, cpu_percent: float
+    ) -> bool:
         """Check if a process exceeds the CPU usage limit.
 
         Args:
-            proc: The psutil.Process object to check.
+            proc: The psutil.Process object that was sampled.
             parent: The parent process to terminate if limits are exceeded.
+            cpu_percent: The CPU usage sampled from proc.
 
         Returns:
             bool: True if CPU limit was exceeded and processes were terminated, False otherwise.
         """
-        if self.cpu_limit is not None:
-            cpu_percent = proc.cpu_percent(interval=0.1)
-            if cpu_percent > self.cpu_limit:
-                logger.warning(
-                    f"Process {proc.pid} exceeded CPU limit: {cpu_percent}% > {self.cpu_limit}%"
-                )
-                self.terminate_callback(parent)
-                return True
+        if self.cpu_limit is not None and cpu_percent > self.cpu_limit:
+            logger.warning(
+                f"Process {proc.pid} exceeded CPU limit: {cpu_percent}% > {self.cpu_limit}%"
+            )
+            self.terminate_callback(parent)
+            return True
         return False
 
-    def _check_memory_limit(self, proc: psutil.Process, parent: psutil.Process) -> bool:
+    def _check_memory_limit(
+        self, proc: psutil.Process, parent: psutil.Process, rss: int
+    ) -> bool:
         """Check if a process exceeds the memory usage limit.
 
         Args:
-            proc: The psutil.Process object to check.
+            proc: The psutil.Process object that was sampled.
             parent: The parent process to terminate if limits are exceeded.
+            rss: The resident set size sampled from proc, in bytes.
 
         Returns:
             bool: True if memory limit was exceeded and processes were terminated, False otherwise.
         """
-        if self.memory_limit is not None:
-            mem_info = proc.memory_info()
-            if mem_info.rss > self.memory_limit:
-                logger.warning(
-                    f"Process {proc.pid} exceeded memory limit: {mem_info.rss} > {self.memory_limit}"
-                )
-                self.terminate_callback(parent)
-                return True
+        if self.memory_limit is not None and rss > self.memory_limit:
+            logger.warning(
+                f"Process {proc.pid} exceeded memory limit: {rss} > {self.memory_limit}"
+            )
+            self.terminate_callback(parent)
+            return True
         return False
 
 
+class _MonitorScheduler:
+    """Drive every ProcessResourceMonitor from a single background thread.
+
+    Monitors are kept in a heap ordered by their next sampling deadline, so the
+    number of threads stays constant however many subprocesses are monitored.
+    """
+
+    _instance: _MonitorScheduler | None = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, ProcessResourceMonitor]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+
+    @classmethod
+    def instance(cls) -> _MonitorScheduler:
+        """Return the process-wide scheduler, creating it on first use."""
+        with cls._instance_lock:
+            if cls._instance is None or cls._instance.stopped:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def stopped(self) -> bool:
+        """Whether stop() has been called on this scheduler."""
+        return self._stopped
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the scheduler thread, dropping every registered monitor.
+
+        A stopped scheduler accepts no new monitors; instance() replaces it.
+
+        Args:
+            timeout: Seconds to wait for the thread to finish, or None to wait
+                until it does.
+        """
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def register(self, monitor: ProcessResourceMonitor) -> None:
+        """Schedule a monitor, sampling it immediately and then every interval.
+
+        Args:
+            monitor: The monitor to drive until its process exits.
+
+        Raises:
+            RuntimeError: If the scheduler has been stopped.
+        """
+        with self._condition:
+            if self._stopped:
+                e = "The resource monitor scheduler has been stopped"
+                raise RuntimeError(e)
+            self._push(monitor, time.monotonic())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="c4f-resource-monitor", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _push(self, monitor: ProcessResourceMonitor, deadline: float) -> None:
+        heapq.heappush(self._heap, (deadline, next(self._counter), monitor))
+
+    def _run(self) -> None:
+        """Sample each monitor when its deadline is due, until stopped."""
+        while True:
+            with self._condition:
+                while not self._heap and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                deadline, _, monitor = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    # Woken early by a new registration, re-check the heap
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+
+            if monitor.poll_once():
+                now = time.monotonic()
+                with self._condition:
+                    self._push(monitor, now + monitor.next_delay(now))
+
+
 class SecureSubprocessTermination:
     """Class responsible for safely terminating processes and their child processes."""
 
@@ -518,6 +1054,14 @@ class SecureSubprocessTermination:
         if not PSUTIL_AVAILABLE:
             return
 
+        self._terminate_tree(proc)
+
+    def _terminate_tree(self, proc: psutil.Process) -> None:
+        """Terminate a process tree; callers have already checked for psutil.
+
+        Args:
+            proc: The psutil.Process object to terminate.
+        """
         try:
             children = self._get_child_processes(proc)
             self._terminate_children(children)
@@ -531,7 +1075,12 @@ class SecureSubprocessTermination:
 
     @staticmethod
     def _get_child_processes(proc: psutil.Process) -> list[psutil.Process]:
-        """Get all child processes recursively."""
+        """Get all child processes recursively.
+
+        psutil builds the parent/child map from a single pass over /proc and
+        walks it from proc, checking creation times so that reused pids are
+        not mistaken for descendants.
+        """
         return proc.children(recursive=True)
 
     @staticmethod
@@ -613,8 +1162,8 @@ class SecureSubprocessTermination:
             return False
 
         try:
-            p = psutil.Process(process.pid)
-            self.terminate_process_and_children(p)
+            p = _get_ps_process(process.pid)
+            self._terminate_tree(p)
         except (psutil.NoSuchProcess, psutil.AccessDenied, ProcessLookupError):
             # Fall back to standard termination
             return False
@@ -656,14 +1205,10 @@ class SecureSubprocessTermination:
         """
         process.terminate()
 
-        # Wait for the process to terminate
-        for _ in range(max_retries):
-            if process.poll() is not None:
-                return
-            time.sleep(wait_time)
-
-        # If still running, kill it forcefully
-        if process.poll() is None:
+        # Block until the process exits or the retry budget runs out, rather
+        # than polling and sleeping once per retry
+        if not _wait_for_exit(process, max_retries * wait_time):
+            # If still running, kill it forcefully
             process.kill()
 
 
@@ -686,6 +1231,12 @@ class SubprocessConfig:
     enable_shell: bool = False
     restricted_env: bool = True
     monitor_interval: float = 0.5
+    monitor_sampling_interval: float = 0.0  # Idle between bursts, 0 never idles
+    monitor_burst_duration: float = 0.0  # Length of each burst of samples
+    capture_output: bool = True  # False discards output via DEVNULL
+    new_process_group: bool = False  # POSIX: run in its own session, kill as a group
+    close_pipes_at_limit: bool = False  # Close a pipe at max_output_size, not at EOF
+    use_posix_spawn: bool = False  # Faster start, but children inherit open fds
 
 
 class SecureSubprocess(SubprocessHandler):
@@ -701,11 +1252,19 @@ class SecureSubprocess(SubprocessHandler):
     - Shell execution control
     """
 
+    # Marker appended to output cut at max_output_size
+    _TRUNC_SUFFIX = "... (truncated)"
+    _TRUNC_SUFFIX_B = _TRUNC_SUFFIX.encode()
+
     def __init__(self, config: SubprocessConfig) -> None:
         super().__init__(
-            config.timeout, config.max_termination_retries, config.termination_wait
+            config.timeout,
+            config.max_termination_retries,
+            config.termination_wait,
+            config.new_process_group,
+            config.use_posix_spawn,
         )
-        self.allowed_commands: set[str] = config.allowed_commands or set()
+        self.allowed_commands = config.allowed_commands or frozenset()
         self.working_dir: Path | None = (
             Path(config.working_dir) if config.working_dir else None
         )
@@ -715,6 +1274,15 @@ class SecureSubprocess(SubprocessHandler):
         self.enable_shell: bool = config.enable_shell
         self.restricted_env: bool = config.restricted_env
         self.monitor_interval: float = config.monitor_interval
+        self.monitor_sampling_interval: float = config.monitor_sampling_interval
+        self.monitor_burst_duration: float = config.monitor_burst_duration
+        self.capture_output: bool = config.capture_output
+        self.close_pipes_at_limit: bool = config.close_pipes_at_limit
+        # The restricted environment, system-specific variables included, is
+        # read from os.environ once and only copied for each command
+        essential_env = self._build_essential_env()
+        self._handle_win32_env(essential_env)
+        self._essential_env: Mapping[str, str] = MappingProxyType(essential_env)
 
         # Create a termination handler
         self.termination_handler = SecureSubprocessTermination(
@@ -735,6 +1303,17 @@ class SecureSubprocess(SubprocessHandler):
                 "Install it with: pip install psutil"
             )
 
+    @property
+    def allowed_commands(self) -> frozenset[str]:
+        """Base command names that may be run; empty allows every command."""
+        return self._allowed_commands
+
+    @allowed_commands.setter
+    def allowed_commands(self, commands: Iterable[str]) -> None:
+        # Frozen so validate_command tests membership against a snapshot that
+        # later changes to the caller's set cannot touch
+        self._allowed_commands = frozenset(commands)
+
     def create_env(self, restricted: bool = True) -> dict[str, str]:
         """Create environment with explicit encoding settings for subprocess.
 
@@ -746,61 +1325,63 @@ class SecureSubprocess(SubprocessHandler):
         """
         if restricted:
             # Create a minimal environment with only essential variables
-            env = self._get_env()
-            # Add only essential paths and variables
-
-            # Add system-specific environment variables
-            self._handle_win32_env(env)
+            env = dict(self._get_env())
         else:
             # Use full environment but still set encoding
-            env = os.environ.copy()
+            env = _copy_environ()
             env["PYTHONIOENCODING"] = "utf-8"
 
         return env
 
-    @staticmethod
-    def _get_env() -> dict[str, str]:
+    def _get_env(self) -> Mapping[str, str]:
         """Get essential environment variables.
 
-        This method is kept for backward compatibility.
+        The variables, including the Windows-specific ones, are read once when
+        the handler is created.
+
+        Returns:
+            Mapping[str, str]: Read-only mapping of essential environment variables.
+        """
+        return self._essential_env
+
+    @staticmethod
+    def _build_essential_env() -> dict[str, str]:
+        """Build the essential environment variables from os.environ.
 
         Returns:
             Dict[str, str]: Dictionary of essential environment variables.
         """
-        return {
-            "PATH": os.environ.get("PATH", ""),
-            "PYTHONIOENCODING": "utf-8",
-            "LANG": os.environ.get("LANG", "en_US.UTF-8"),
-            "LC_ALL": os.environ.get("LC_ALL", "en_US.UTF-8"),
+        env = {
+            name: os.environ.get(name, default)
+            for name, default in _ESSENTIAL_ENV_VARS
         }
+        env["PYTHONIOENCODING"] = "utf-8"
+        return env
 
     @staticmethod
-    def _handle_win32_env(env: dict[str, str]) -> None:
+    def _handle_win32_env(env: dict[str, str], platform: str = sys.platform) -> None:
         """Add Windows-specific environment variables.
 
         This method is kept for backward compatibility.
 
         Args:
             env: Environment dictionary to update.
+            platform: Platform identifier to apply, defaults to sys.platform.
         """
-        if sys.platform == "win32":
+        if platform == "win32":
             env.update(
-                {
-                    "SYSTEMROOT": os.environ.get("SYSTEMROOT", "C:\\Windows"),
-                    "TEMP": os.environ.get("TEMP", ""),
-                    "TMP": os.environ.get("TMP", ""),
-                    "PATHEXT": os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD"),
-                    "COMSPEC": os.environ.get(
-                        "COMSPEC", "C:\\Windows\\system32\\cmd.exe"
-                    ),
-                }
+                (name, os.environ.get(name, default))
+                for name, default in _WIN32_ENV_VARS
             )
 
-    def validate_command(self, command: list[str]) -> bool:
+    def validate_command(
+        self, command: list[str], platform: str = sys.platform
+    ) -> bool:
         """Validate that the command is allowed to be executed.
 
         Args:
             command: Command to validate as a list of strings.
+            platform: Platform identifier to apply, defaults to sys.platform.
 
         Returns:
             bool: True if command is valid, False otherwise.
@@ -808,27 +1389,22 @@ class SecureSubprocess(SubprocessHandler):
         if not command:
             return False
 
-        # Extract the base command without arguments
-        base_cmd = Path(command[0]).name
-
-        # On Windows, executables often have extensions (.exe, .bat, etc.)
-        if sys.platform == "win32":
-            # Remove the extension for command validation
-            base_cmd = Path(base_cmd).stem
-
         # If allowed_commands is empty, all commands are allowed
         if not self.allowed_commands:
             return True
 
         # Check if the base command is in the allowed list
-        return base_cmd in self.allowed_commands
+        return _base_command(command[0], platform) in self.allowed_commands
 
     @staticmethod
-    def sanitize_command(command: list[str]) -> list[str]:
+    def sanitize_command(
+        command: list[str], platform: str = sys.platform
+    ) -> list[str]:
         """Sanitize command arguments to prevent injection attacks.
 
         Args:
             command: Command to sanitize as a list of strings.
+            platform: Platform identifier to apply, defaults to sys.platform.
 
         Returns:
             List[str]: Sanitized command.
@@ -836,22 +1412,13 @@ class SecureSubprocess(SubprocessHandler):
         if not command:
             return []
 
-        # Keep the first element (command) as is
-        sanitized = [command[0]]
-
-        # Sanitize each argument using platform-specific approach
-        for arg in command[1:]:
-            if sys.platform == "win32":
-                # Windows-specific sanitization
-                # Remove characters that could be dangerous in Windows commands
-                sanitized_arg = re.sub(r"[&|^<>()]", "", arg)
-            else:
-                # Unix-like sanitization
-                sanitized_arg = re.sub(r"[;&|`$<>]", "", arg)
-
-            sanitized.append(sanitized_arg)
+        # Remove characters that could be dangerous on the target platform
+        dangerous = (
+            _WIN32_DANGEROUS_CHARS if platform == "win32" else _POSIX_DANGEROUS_CHARS
+        )
 
-        return sanitized
+        # Keep the first element (command) as is
+        return [command[0], *(dangerous.sub("", arg) for arg in command[1:])]
 
     def _start_resource_monitoring(self, process: subprocess.Popen[Any]) -> None:
         """Start resource monitoring for the process if limits are set.
@@ -862,19 +1429,47 @@ class SecureSubprocess(SubprocessHandler):
         if PSUTIL_AVAILABLE and (
             self.cpu_limit is not None or self.memory_limit is not None
         ):
-            import threading
-
             monitor = ProcessResourceMonitor(
                 process=process,
                 cpu_limit=self.cpu_limit,
                 memory_limit=self.memory_limit,
                 monitor_interval=self.monitor_interval,
                 terminate_callback=self.termination_handler.terminate_process_and_children,
+                sampling_interval=self.monitor_sampling_interval,
+                burst_duration=self.monitor_burst_duration,
             )
-            monitor_thread = threading.Thread(
-                target=monitor.start_monitoring, daemon=True
+            _MonitorScheduler.instance().register(monitor)
+
+    def _apply_rlimits(
+        self, process: subprocess.Popen[Any], timeout: int | None
+    ) -> None:
+        """Have the kernel cap the CPU time of the process.
+
+        cpu_limit is a percentage, so the process may use at most that share
+        of the timeout in CPU seconds. The kernel sends SIGXCPU at the soft
+        limit and SIGKILL one second later. The limit is applied with
+        prlimit after the process starts rather than from a preexec_fn, which
+        is unsafe with threads and rules out the posix_spawn fast path.
+
+        Memory is not capped here: RLIMIT_AS bounds virtual address space,
+        not the resident memory that memory_limit describes, so it would break
+        programs that map large files. The resource monitor enforces both
+        limits either way.
+
+        Args:
+            process: The started subprocess.Popen object.
+            timeout: Timeout for this run, or None for the default.
+        """
+        if not PRLIMIT_AVAILABLE or self.cpu_limit is None or process.pid is None:
+            return
+
+        budget = self.cpu_limit / 100 * (timeout or self.timeout)
+        cpu_seconds = max(math.ceil(budget), 1)
+        with contextlib.suppress(OSError, ValueError):
+            # The process may already have exited
+            resource.prlimit(
+                process.pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1)
             )
-            monitor_thread.start()
 
     # Delegate process termination to the termination handler
     def _terminate_process_and_children(self, proc: psutil.Process) -> None:
@@ -883,34 +1478,55 @@ class SecureSubprocess(SubprocessHandler):
 
     def _terminate_process(self, process: subprocess.Popen[Any] | None) -> None:
         """Delegate to termination handler."""
+        if self.new_process_group and self._terminate_process_group(process):
+            return
         self.termination_handler.terminate_process(
             process,  # type: ignore
             max_termination_retries=self.max_termination_retries,
             termination_wait=self.termination_wait,
         )
 
-    def _run_secure_subprocess(
+    def _cleanup_process(self, process: subprocess.Popen[Any] | None) -> None:
+        """Clean up process resources and drop its cached psutil.Process."""
+        super()._cleanup_process(process)
+        if process is not None:
+            _evict_ps_process(process.pid)
+
+    def _run_secure_subprocess(  # noqa: PLR0913
         self,
         command: list[str],
         is_text_mode: bool,
         encoding: str = "utf-8",
         errors: str = "replace",
         timeout: int | None = None,
+        *,
+        discard_output: bool = False,
     ) -> tuple[str, str, int]:
         """Common secure subprocess execution logic for both text and binary modes.
 
+        Args:
+            command: Command to execute as a list of strings.
+            is_text_mode: Whether the output is decoded as text.
+            encoding: Character encoding to use for decoding.
+            errors: How to handle encoding/decoding errors.
+            timeout: Timeout for this run, or None for the default.
+            discard_output: Send stdout and stderr to the null device, for
+                callers that only need the return code.
+
         Returns:
             Tuple[str, str, int]: stdout, stderr, and return code.
         """
-        # Validate and prepare command
+        # Validate and prepare command before building anything for it
         sanitized_command = self._prepare_command(command)
 
         # Prepare Popen arguments based on mode
         popen_kwargs = (
-            self._prepare_text_mode_kwargs(encoding, errors)
+            self._prepare_text_mode_kwargs()
             if is_text_mode
             else self._prepare_binary_mode_kwargs()
         )
+        if discard_output:
+            popen_kwargs["stdout"] = popen_kwargs["stderr"] = subprocess.DEVNULL
 
         params = SubprocessExecutionParams(
             command=sanitized_command,
@@ -936,8 +1552,7 @@ class SecureSubprocess(SubprocessHandler):
             ValueError: If the command is not allowed.
         """
         if not self.validate_command(command):
-            e = f"Command not allowed: {command[0]}"
-            raise ValueError(e)
+            raise ValueError(_not_allowed_message(command[0] if command else ""))
 
         sanitized_command = self.sanitize_command(command)
 
@@ -946,30 +1561,18 @@ class SecureSubprocess(SubprocessHandler):
 
         return sanitized_command
 
-    def _prepare_text_mode_kwargs(self, encoding: str, errors: str) -> dict[str, Any]:
+    def _prepare_text_mode_kwargs(self) -> dict[str, Any]:
         """Prepare kwargs for text mode subprocess.
 
-        Args:
-            encoding: Character encoding to use.
-            errors: How to handle encoding/decoding errors.
+        The pipes are opened in binary mode; text mode output is decoded by
+        _process_output with the run's encoding and errors, so that only the
+        bytes kept after truncation are decoded, and a truncated multibyte
+        sequence is never half-decoded.
 
         Returns:
             Dict[str, Any]: Keyword arguments for subprocess.Popen.
         """
-        env = self.create_env(restricted=self.restricted_env)
-
-        popen_kwargs: dict[str, Any] = {
-            "stdout": subprocess.PIPE,
-            "stderr": subprocess.PIPE,
-            "text": True,
-            "encoding": encoding,
-            "errors": errors,
-            "env": env,
-            "universal_newlines": True,
-        }
-
-        self._add_optional_popen_args(popen_kwargs)
-        return popen_kwargs
+        return self._build_popen_kwargs()
 
     def _prepare_binary_mode_kwargs(self) -> dict[str, Any]:
         """Prepare kwargs for binary mode subprocess.
@@ -977,12 +1580,22 @@ class SecureSubprocess(SubprocessHandler):
         Returns:
             Dict[str, Any]: Keyword arguments for subprocess.Popen.
         """
-        env = self.create_env(restricted=self.restricted_env)
+        return self._build_popen_kwargs()
+
+    def _build_popen_kwargs(self) -> dict[str, Any]:
+        """Build the Popen kwargs shared by text and binary mode in one dict.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments for subprocess.Popen.
+        """
+        # Uncaptured output goes straight to the null device, with no pipes
+        output = subprocess.PIPE if self.capture_output else subprocess.DEVNULL
 
         popen_kwargs: dict[str, Any] = {
-            "stdout": subprocess.PIPE,
-            "stderr": subprocess.PIPE,
-            "env": env,
+            "stdout": output,
+            "stderr": output,
+            "env": self.create_env(restricted=self.restricted_env),
+            "bufsize": -1,  # Fully buffered pipes, read in large chunks
         }
 
         self._add_optional_popen_args(popen_kwargs)
@@ -992,7 +1605,7 @@ class SecureSubprocess(SubprocessHandler):
         """Add optional arguments to Popen kwargs if they have values.
 
         Args:
-            popen_kwargs: Dictionary of keyword arguments to modify.
+            popen_kwargs: Dictionary of keyword arguments to modify in place.
         """
         if self.working_dir:
             popen_kwargs["cwd"] = self.working_dir
@@ -1000,21 +1613,82 @@ class SecureSubprocess(SubprocessHandler):
         if self.enable_shell:
             popen_kwargs["shell"] = True
 
-    def _truncate_output(self, output: str | bytes) -> str | bytes:
+        if self.new_process_group:
+            popen_kwargs["start_new_session"] = True
+
+    def _truncate_output(
+        self, output: str | bytes | bytearray | memoryview
+    ) -> str | bytes:
         """Truncate output if it exceeds the maximum size.
 
         Args:
-            output: The output to truncate.
+            output: The output to truncate. Any bytes-like object is accepted,
+                so streamed buffers can be passed without converting them first.
 
         Returns:
             Union[str, bytes]: Truncated output.
         """
-        if len(output) > self.max_output_size:
-            if isinstance(output, str):
-                return output[: self.max_output_size] + "... (truncated)"
-            if isinstance(output, bytes):
-                return output[: self.max_output_size] + b"... (truncated)"
-        return output
+        if isinstance(output, str):
+            if len(output) <= self.max_output_size:
+                return output
+            return output[: self.max_output_size] + self._TRUNC_SUFFIX
+
+        view = memoryview(output)
+        if view.nbytes <= self.max_output_size:
+            return output if isinstance(output, bytes) else view.tobytes()
+
+        # Join a zero-copy view of the kept prefix with the marker so the
+        # result is built with a single copy instead of slice + concatenation.
+        return b"".join((view.cast("B")[: self.max_output_size], self._TRUNC_SUFFIX_B))
+
+    def _decode_truncated(
+        self, output: str | bytes | bytearray | memoryview, encoding: str, errors: str
+    ) -> str:
+        """Decode binary output, truncating it in the same pass.
+
+        Only the bytes that are kept are decoded, so oversized output is never
+        decoded in full just to be discarded.
+
+        Args:
+            output: The raw output to decode.
+            encoding: Character encoding to use for decoding.
+            errors: How to handle encoding/decoding errors.
+
+        Returns:
+            str: Decoded and, if needed, truncated output.
+        """
+        if isinstance(output, str):
+            return str(self._truncate_output(output))
+        view = memoryview(output).cast("B")
+        if view.nbytes <= self.max_output_size:
+            return str(view, encoding, errors)
+        return str(view[: self.max_output_size], encoding, errors) + self._TRUNC_SUFFIX
+
+    def _decode_text(
+        self, output: str | bytes | bytearray | memoryview, encoding: str, errors: str
+    ) -> str:
+        """Decode text mode output with universal newlines, truncating it.
+
+        An incremental decoder is used so that a multibyte sequence cut by
+        truncation is dropped instead of being decoded as an error.
+
+        Args:
+            output: The raw output to decode.
+            encoding: Character encoding to use for decoding.
+            errors: How to handle encoding/decoding errors.
+
+        Returns:
+            str: Decoded and, if needed, truncated output.
+        """
+        if isinstance(output, str):
+            return str(self._truncate_output(output))
+        view = memoryview(output).cast("B")
+        truncated = view.nbytes > self.max_output_size
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(errors), translate=True
+        )
+        text = decoder.decode(view[: self.max_output_size], final=not truncated)
+        return text + self._TRUNC_SUFFIX if truncated else text
 
     def _execute_subprocess(
         self,
@@ -1035,6 +1709,7 @@ class SecureSubprocess(SubprocessHandler):
 
         try:
             process = self._start_process(params.command, params.popen_kwargs)
+            self._apply_rlimits(process, params.timeout)
             stdout, stderr = self._communicate_with_process(process, params.timeout)
             processed_stdout, processed_stderr, returncode = self._process_output(
                 stdout,
@@ -1047,7 +1722,12 @@ class SecureSubprocess(SubprocessHandler):
             # Log completion
             logger.info(f"Command completed with return code: {returncode}")
         except subprocess.TimeoutExpired:
-            self._handle_timeout(process, params.command, params.timeout)
+            # communicate() does not kill on timeout; kill once here so the
+            # timeout handler does not run a second terminate/poll cycle.
+            self._kill_timed_out_process(process)
+            self._handle_timeout(
+                process, params.command, params.timeout, already_dead=True
+            )
         except Exception as e:
             self._handle_execution_error(process, e)
         else:
@@ -1068,28 +1748,175 @@ class SecureSubprocess(SubprocessHandler):
         Returns:
             subprocess.Popen: The started process.
         """
-        process = subprocess.Popen(command, **popen_kwargs)
+        process = super()._start_process(command, popen_kwargs)
         self._start_resource_monitoring(process)
         return process
 
     def _communicate_with_process(
         self, process: subprocess.Popen[Any], timeout: int | None
     ) -> tuple[str | bytes, str | bytes]:
-        """Communicate with the process and get its output."""
-        return process.communicate(timeout=timeout or self.timeout)
+        """Stream the process output, keeping only what can survive truncation.
+
+        Both pipes are drained to EOF so the child never blocks on a full pipe,
+        but at most max_output_size + 1 bytes are kept per stream. The extra
+        byte lets the truncation helpers detect the overflow. With
+        close_pipes_at_limit, a pipe is closed as soon as it overflows instead,
+        so a runaway child fails its next write with EPIPE rather than being
+        drained until it finishes.
+
+        Raises:
+            subprocess.TimeoutExpired: If the process outlives the timeout.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        limit = self.max_output_size + 1
+        if sys.platform == "win32":
+            # Selectors only support sockets on Windows, so drain on threads
+            drain = self._drain_with_threads
+        else:
+            drain = self._drain_with_selector
+        stdout, stderr = drain(
+            process, timeout, deadline, limit, self.close_pipes_at_limit
+        )
+
+        process.wait(timeout=max(deadline - time.monotonic(), 0))
+        return stdout, stderr
+
+    @staticmethod
+    def _drain_with_selector(
+        process: subprocess.Popen[Any],
+        timeout: int,
+        deadline: float,
+        limit: int,
+        close_at_limit: bool = False,
+    ) -> tuple[bytes, bytes]:
+        """Drain both pipes from the calling thread, multiplexed by a selector.
+
+        Raises:
+            subprocess.TimeoutExpired: If the pipes are still open at the deadline.
+        """
+        # Streams that are not piped, e.g. sent to DEVNULL, produce no output
+        results = [b"", b""]
+        with selectors.DefaultSelector() as selector:
+            for index, name in enumerate(("stdout", "stderr")):
+                pipe = getattr(process, name)
+                if pipe is not None:
+                    selector.register(
+                        pipe.fileno(), selectors.EVENT_READ, (index, bytearray(), pipe)
+                    )
+
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(process.args, timeout)
+                for key, _ in selector.select(remaining):
+                    index, kept, pipe = key.data
+                    chunk = os.read(key.fd, _READ_CHUNK_SIZE)
+                    if (room := limit - len(kept)) > 0:
+                        kept += memoryview(chunk)[:room]
+                    full = close_at_limit and len(kept) >= limit
+                    if not chunk or full:
+                        selector.unregister(key.fd)
+                        if full:
+                            # The rest would be discarded; stop the writer instead
+                            pipe.close()
+                        results[index] = bytes(kept)
+
+        return results[0], results[1]
+
+    def _drain_with_threads(
+        self,
+        process: subprocess.Popen[Any],
+        timeout: int,
+        deadline: float,
+        limit: int,
+        close_at_limit: bool = False,
+    ) -> tuple[bytes, bytes]:
+        """Drain both pipes on one reader thread each.
+
+        Raises:
+            subprocess.TimeoutExpired: If a reader is still running at the deadline.
+        """
+        # Streams that are not piped, e.g. sent to DEVNULL, produce no output
+        results: list[Any] = [b"", b""]
+        readers = {
+            name: threading.Thread(
+                target=self._read_capped,
+                args=(pipe, limit, results, index, close_at_limit),
+                daemon=True,
+            )
+            for index, name in enumerate(("stdout", "stderr"))
+            if (pipe := getattr(process, name)) is not None
+        }
+        for reader in readers.values():
+            reader.start()
+        for reader in readers.values():
+            reader.join(max(deadline - time.monotonic(), 0))
+
+        live = [name for name, reader in readers.items() if reader.is_alive()]
+        if live:
+            # A descendant may still hold the pipe open. Leave the pipe to its
+            # reader, which closes it at EOF: closing it from cleanup would
+            # block behind the reader's pending read.
+            for name in live:
+                setattr(process, name, None)
+            raise subprocess.TimeoutExpired(process.args, timeout)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results[0], results[1]
+
+    @staticmethod
+    def _read_capped(
+        pipe: IO[Any],
+        limit: int,
+        results: list[Any],
+        index: int,
+        close_at_limit: bool = False,
+    ) -> None:
+        """Read a pipe to EOF, storing at most limit bytes in results[index].
+
+        With close_at_limit, reading stops and the pipe is closed as soon as
+        limit bytes have been kept.
+
+        Errors are stored instead of raised so the calling thread can re-raise
+        them, matching what communicate() would do.
+        """
+        kept = bytearray()
+        try:
+            while chunk := pipe.read(_READ_CHUNK_SIZE):
+                if (room := limit - len(kept)) > 0:
+                    kept += memoryview(chunk)[:room]
+                if close_at_limit and len(kept) >= limit:
+                    break
+            results[index] = bytes(kept)
+        except Exception as e:  # noqa: BLE001
+            results[index] = e
+        finally:
+            with contextlib.suppress(OSError):
+                pipe.close()
 
     def _handle_timeout(
         self,
         process: subprocess.Popen[Any] | None,
         command: list[str],
         timeout: int | None,
+        already_dead: bool = False,
     ) -> NoReturn:
         """Handle a subprocess timeout.
 
+        Args:
+            process: The timed out subprocess.Popen object.
+            command: The command that timed out.
+            timeout: The timeout that was exceeded.
+            already_dead: Whether the process has already been killed.
+
         Raises:
             TimeoutError: Always raised to indicate the timeout.
         """
-        self._terminate_process(process)
+        if not already_dead:
+            self._terminate_process(process)
         logger.warning(f"Command timed out: {' '.join(command)}")
         e = f"Command timed out after {timeout or self.timeout} seconds: {' '.join(command)}"
         raise TimeoutError(e)
@@ -1127,23 +1954,12 @@ class SecureSubprocess(SubprocessHandler):
             Tuple[str, str, int]: Processed stdout, stderr, and return code.
         """
         if is_text_mode:
-            stdout_str = str(self._truncate_output(stdout))
-            stderr_str = str(self._truncate_output(stderr))
+            stdout_str = self._decode_text(stdout, encoding, errors)
+            stderr_str = self._decode_text(stderr, encoding, errors)
         else:
             # Binary mode needs decoding
-            stdout_bytes = self._truncate_output(stdout)
-            stderr_bytes = self._truncate_output(stderr)
-            # Handle proper type conversion
-            stdout_str = (
-                stdout_bytes.decode(encoding, errors=errors)
-                if isinstance(stdout_bytes, bytes)
-                else str(stdout_bytes)
-            )
-            stderr_str = (
-                stderr_bytes.decode(encoding, errors=errors)
-                if isinstance(stderr_bytes, bytes)
-                else str(stderr_bytes)
-            )
+            stdout_str = self._decode_truncated(stdout, encoding, errors)
+            stderr_str = self._decode_truncated(stderr, encoding, errors)
 
         return stdout_str, stderr_str, process.returncode
 
@@ -1178,3 +1994,11 @@ class SecureSubprocess(SubprocessHandler):
             errors=errors,
             timeout=timeout,
         )
+
+    def run_command_for_status(
+        self, command: list[str], timeout: int | None = None
+    ) -> int:
+        """Execute a command for its return code only, with security measures."""
+        return self._run_secure_subprocess(
+            command, is_text_mode=False, timeout=timeout, discard_output=True
+        )[2]
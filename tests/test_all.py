@@ -10,6 +10,7 @@ import pytest
 
 from c4f._purifier import Purify
 from c4f.main import *
+from c4f.main import _get_git_handler
 from c4f.utils import FileChange
 
 
@@ -32,9 +33,11 @@ def empty_file():
 
 @pytest.fixture
 def mock_popen():
-    with patch("subprocess.Popen") as mock_popen:
+    with patch("subprocess.Popen") as mock_popen, patch(
+        "c4f.utils.SecureSubprocess._communicate_with_process",
+        return_value=("mock output", "mock error"),
+    ):
         mock_process = MagicMock()
-        mock_process.communicate.return_value = ("mock output", "mock error")
         mock_process.returncode = 0
         mock_popen.return_value = mock_process
         yield mock_popen
@@ -50,7 +53,16 @@ def test_run_git_command(mock_popen):
     assert args[0] == ["git", "status"]
     assert kwargs["stdout"] == subprocess.PIPE
     assert kwargs["stderr"] == subprocess.PIPE
-    assert kwargs["text"] == True
+    assert kwargs["bufsize"] == -1
+    assert "text" not in kwargs
+
+
+def test_run_git_command_reuses_handler(mock_popen):
+    run_git_command(["git", "status"])
+    run_git_command(["git", "status"])
+    assert _get_git_handler(None) is _get_git_handler(None)
+    assert _get_git_handler(None) is not _get_git_handler(5)
+    assert mock_popen.call_count == 2
 
 
 @pytest.fixture
@@ -1487,6 +1499,8 @@ def test_generate_commit_message_all_attempts_fail(
         (datetime.now().timestamp() - 3700, "1h ago"),  # 1 hour ago
         (datetime.now().timestamp() - 86500, "1d ago"),  # 1 day ago
     ],
+    # Timestamps differ between collections, so name the cases explicitly
+    ids=["zero", "now", "30s", "2m", "1h", "1d"],
 )
 def test_format_time_ago_normal_cases(timestamp, expected_result):
     """Test format_time_ago with various timestamps."""
@@ -1877,9 +1891,11 @@ def test_generate_diff_summary(mock_config):
 
 # Test for line 63: Error handling in run_git_command
 def test_run_git_command_error():
-    with patch("subprocess.Popen") as mock_popen:
+    with patch("subprocess.Popen") as mock_popen, patch(
+        "c4f.utils.SecureSubprocess._communicate_with_process",
+        side_effect=Exception("Test error"),
+    ):
         mock_process = MagicMock()
-        mock_process.communicate.side_effect = Exception("Test error")
         mock_popen.return_value = mock_process
 
         with pytest.raises(Exception):
@@ -1,15 +1,18 @@
 import logging
 import os
+import signal
 import subprocess
 import sys
 import threading
 import time
+from collections.abc import Callable
 from pathlib import Path
 from typing import Any
-from unittest.mock import MagicMock, PropertyMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
 
+from c4f import utils
 from c4f.utils import (
     FileChange,
     ProcessResourceMonitor,
@@ -20,17 +23,22 @@ from c4f.utils import (
     SubprocessExecutionParams,
 )
 
-# Define test commands that work cross-platform
+# Define test commands that work cross-platform, so tests need no platform branches
 if sys.platform == "win32":
-    ECHO_CMD = ["cmd", "/c", "echo", "hello"]
+    ECHO_PREFIX = ["cmd", "/c", "echo"]
     SLEEP_CMD = ["timeout", "2"]
-    NOT_EXIST_CMD = ["command_does_not_exist"]
-    CAT_FILE_CMD = ["type"]
+    CAT_FILE_CMD = ["cmd", "/c", "type"]
+    LIST_DIR_CMD = ["cmd", "/c", "dir"]
+    # Variables the restricted environment adds on Windows
+    PLATFORM_ENV_VARS = {"SYSTEMROOT", "TEMP", "TMP", "PATHEXT", "COMSPEC"}
 else:
-    ECHO_CMD = ["echo", "hello"]
+    ECHO_PREFIX = ["echo"]
     SLEEP_CMD = ["sleep", "2"]
-    NOT_EXIST_CMD = ["command_does_not_exist"]
     CAT_FILE_CMD = ["cat"]
+    LIST_DIR_CMD = ["ls"]
+    PLATFORM_ENV_VARS = set()
+ECHO_CMD = [*ECHO_PREFIX, "hello"]
+NOT_EXIST_CMD = ["command_does_not_exist"]
 
 
 # Utility functions for tests
@@ -41,16 +49,89 @@ def create_temp_file(tmp_path, content="test content"):
     return test_file
 
 
+class _FakePopen:
+    """Stand-in for subprocess.Popen that counts terminate and kill calls.
+
+    Much cheaper to build than MagicMock(spec=subprocess.Popen), for tests that
+    only drive poll, wait, terminate and kill. Like Popen, returncode stays None
+    until poll or wait sees the process exit, and a signal makes it exit.
+    """
+
+    __slots__ = (
+        "pid",
+        "returncode",
+        "stdout",
+        "stderr",
+        "poll_result",
+        "terminate_error",
+        "terminate_calls",
+        "kill_calls",
+    )
+
+    def __init__(self, poll_result: int | None = None) -> None:
+        self.pid = 12345
+        self.returncode: int | None = None
+        self.stdout = None
+        self.stderr = None
+        self.poll_result = poll_result
+        self.terminate_error: OSError | None = None
+        self.terminate_calls = 0
+        self.kill_calls = 0
+
+    def poll(self) -> int | None:
+        self.returncode = self.poll_result
+        return self.returncode
+
+    def wait(self, timeout: float | None = None) -> int:
+        if self.poll() is None:
+            raise subprocess.TimeoutExpired("fake", timeout)
+        return self.poll_result
+
+    def terminate(self) -> None:
+        self.terminate_calls += 1
+        if self.terminate_error is not None:
+            raise self.terminate_error
+        self.poll_result = -signal.SIGTERM
+
+    def kill(self) -> None:
+        self.kill_calls += 1
+        self.poll_result = -signal.SIGKILL
+
+
 # Fixtures
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def clear_ps_process_cache():
+    """Keep cached psutil.Process objects (often mocks) from leaking between tests."""
+    utils._PS_PROCESS_CACHE.clear()
+    yield
+    utils._PS_PROCESS_CACHE.clear()
+
+
+@pytest.fixture(scope="module")
 def subprocess_handler():
-    """Return a SubprocessHandler instance with short timeout for testing."""
+    """Return a SubprocessHandler instance with short timeout for testing.
+
+    The instance is shared by every test in the module; tests that change its
+    attributes must do so through monkeypatch so the change is undone.
+    """
     return SubprocessHandler(timeout=2, max_termination_retries=2, termination_wait=0.1)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
+def non_utf8_file(tmp_path_factory):
+    """Write a small file that is not valid UTF-8, once for the module."""
+    path = tmp_path_factory.mktemp("encoding") / "non_utf8.bin"
+    path.write_bytes(b"\x80\x81\x82")
+    return path
+
+
+@pytest.fixture(scope="class")
 def secure_subprocess():
-    """Return a SecureSubprocess instance with permissive settings for testing."""
+    """Return a SecureSubprocess instance with permissive settings for testing.
+
+    The instance is shared by every test in a class; tests that change its
+    attributes must do so through monkeypatch so the change is undone.
+    """
     config = SubprocessConfig(
         timeout=2,
         max_termination_retries=2,
@@ -64,9 +145,12 @@ def secure_subprocess():
     return SecureSubprocess(config)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def restricted_secure_subprocess():
-    """Return a SecureSubprocess instance with restrictive settings."""
+    """Return a SecureSubprocess instance with restrictive settings.
+
+    Shared module-wide like subprocess_handler, so changes go through monkeypatch.
+    """
     # Only allow echo command for testing
     allowed_cmds = {"echo", "cmd", "type", "cat", "sleep", "timeout"}
     config = SubprocessConfig(
@@ -82,6 +166,43 @@ def restricted_secure_subprocess():
     return SecureSubprocess(config)
 
 
+@pytest.fixture(scope="session")
+def echo_hello_result():
+    """Run ECHO_CMD once per session and share the captured result."""
+    handler = SubprocessHandler(timeout=2)
+    return handler.run_command(ECHO_CMD)
+
+
+@pytest.fixture
+def psutil_process():
+    """Return a psutil.Process mock reporting 5% CPU and 512KB of memory."""
+    mock = MagicMock()
+    mock.cpu_percent.return_value = 5.0
+    mock.memory_info.return_value = MagicMock(rss=512 * 1024)
+    mock.children.return_value = []
+    return mock
+
+
+@pytest.fixture
+def monitor_scheduler():
+    """Return a private _MonitorScheduler whose thread is stopped after the test."""
+    scheduler = utils._MonitorScheduler()
+    yield scheduler
+    scheduler.stop(timeout=5)
+
+
+@pytest.fixture
+def fake_process(monkeypatch):
+    """Return a running _FakePopen.
+
+    pidfds are disabled, so termination never opens or signals the real
+    process that happens to have the fake pid.
+    """
+    monkeypatch.setattr(utils, "PIDFD_SIGNAL_AVAILABLE", False)
+    monkeypatch.setattr(utils, "_open_pidfd", lambda process: None)
+    return _FakePopen()
+
+
 @pytest.fixture
 def mock_process():
     """Create a mock for subprocess.Popen with controllable behavior."""
@@ -90,12 +211,9 @@ def mock_process():
     mock.returncode = 0
     mock.pid = 12345  # Fake PID
 
-    stdout_mock = MagicMock()
-    stderr_mock = MagicMock()
-
-    # Configure the mock's stdout and stderr attributes
-    type(mock).stdout = PropertyMock(return_value=stdout_mock)
-    type(mock).stderr = PropertyMock(return_value=stderr_mock)
+    # Plain attributes keep the mock's class free of per-test descriptors
+    mock.stdout = MagicMock()
+    mock.stderr = MagicMock()
 
     return mock
 
@@ -122,6 +240,9 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
+# Skip at collection time so fixtures are never set up for psutil-only tests
+requires_psutil = pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+
 
 # Tests for SubprocessHandler
 class TestSubprocessHandler:
@@ -152,9 +273,26 @@ class TestSubprocessHandler:
         # Test that it's a copy of os.environ
         assert len(env) >= len(os.environ)
 
-    def test_run_command_success(self, subprocess_handler):
+    def test_create_env_tracks_environ_changes(self, monkeypatch):
+        """Test the cached environment copy is rebuilt when os.environ changes."""
+        SubprocessHandler.create_env(True)
+        monkeypatch.setenv("C4F_TEST_VAR", "first")
+        assert SubprocessHandler.create_env(True)["C4F_TEST_VAR"] == "first"
+
+        monkeypatch.setenv("C4F_TEST_VAR", "second")
+        env = SubprocessHandler.create_env(True)
+        assert env["C4F_TEST_VAR"] == "second"
+
+        # Callers get their own copy, never the cached dict
+        env["C4F_TEST_VAR"] = "changed"
+        assert SubprocessHandler.create_env(True)["C4F_TEST_VAR"] == "second"
+
+        monkeypatch.delenv("C4F_TEST_VAR")
+        assert "C4F_TEST_VAR" not in SubprocessHandler.create_env(True)
+
+    def test_run_command_success(self, echo_hello_result):
         """Test successful command execution."""
-        stdout, stderr, returncode = subprocess_handler.run_command(ECHO_CMD)
+        stdout, stderr, returncode = echo_hello_result
         assert "hello" in stdout
         assert stderr == ""
         assert returncode == 0
@@ -181,6 +319,44 @@ class TestSubprocessHandler:
             with pytest.raises(TimeoutError):
                 subprocess_handler.run_command(SLEEP_CMD, timeout=0.1)
 
+    @pytest.mark.skipif(
+        not getattr(subprocess, "_USE_POSIX_SPAWN", False),
+        reason="posix_spawn is not used by subprocess on this platform",
+    )
+    def test_run_command_uses_posix_spawn(self, subprocess_handler, monkeypatch):
+        """Test the base handler starts processes with posix_spawn when asked to."""
+        monkeypatch.setattr(subprocess_handler, "use_posix_spawn", True)
+        with patch("os.posix_spawn", wraps=os.posix_spawn) as mock_spawn:
+            stdout, _, returncode = subprocess_handler.run_command(ECHO_CMD)
+
+        mock_spawn.assert_called_once()
+        assert "hello" in stdout
+        assert returncode == 0
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX file descriptors only")
+    def test_run_command_closes_inheritable_fds(self, subprocess_handler):
+        """Test children do not inherit descriptors unless posix_spawn is opted in."""
+        read_fd, write_fd = os.pipe()
+        try:
+            os.set_inheritable(read_fd, True)
+            cmd = [sys.executable, "-c", f"__import__('os').fstat({read_fd})"]
+
+            assert subprocess_handler.run_command_for_status(cmd) != 0
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_run_command_for_status(self, subprocess_handler):
+        """Test run_command_for_status returns the exit code without opening pipes."""
+        with patch("subprocess.Popen", wraps=subprocess.Popen) as mock_popen:
+            assert subprocess_handler.run_command_for_status(ECHO_CMD) == 0
+
+        assert mock_popen.call_args.kwargs["stdout"] == subprocess.DEVNULL
+        assert mock_popen.call_args.kwargs["stderr"] == subprocess.DEVNULL
+
+        exit_3 = [sys.executable, "-c", "import sys; sys.exit(3)"]
+        assert subprocess_handler.run_command_for_status(exit_3) == 3
+
     def test_run_text_mode(self, subprocess_handler):
         """Test run_text_mode method."""
         stdout, stderr, returncode = subprocess_handler.run_text_mode(ECHO_CMD)
@@ -207,54 +383,95 @@ class TestSubprocessHandler:
         # Verify termination was attempted
         mock_process.poll.assert_called()
 
-    def test_terminate_process(self, subprocess_handler, mock_process):
+    def test_terminate_process(self, subprocess_handler, fake_process):
         """Test _terminate_process method attempts termination."""
-        # Configure mock to simulate running then terminated process
-        mock_process.poll.return_value = None  # Process is running
-
-        # Call the termination method
-        subprocess_handler._terminate_process(mock_process)
+        # The fake process is running, then exits once terminated
+        subprocess_handler._terminate_process(fake_process)
 
         # Verify termination was called
-        mock_process.terminate.assert_called_once()
+        assert fake_process.terminate_calls == 1
+        assert fake_process.kill_calls == 0
 
         # Test with already terminated process
-        mock_process.reset_mock()
-        mock_process.poll.return_value = 0  # Process already terminated
+        finished = _FakePopen(poll_result=0)
 
         # Call the termination method again
-        subprocess_handler._terminate_process(mock_process)
+        subprocess_handler._terminate_process(finished)
 
         # Verify termination was not called since process was already terminated
-        mock_process.terminate.assert_not_called()
+        assert finished.terminate_calls == 0
 
-    def test_terminate_process_with_kill(self, subprocess_handler, mock_process):
+    def test_terminate_process_with_kill(self, subprocess_handler, fake_process):
         """Test _terminate_process escalates to kill if necessary."""
-        # Configure mock to simulate a stubborn process
-        mock_process.poll.return_value = None  # Process never terminates
+        # Call the termination method, with the wait running out of time
+        with patch("c4f.utils._wait_for_exit", return_value=False) as mock_wait:
+            subprocess_handler._terminate_process(fake_process)
 
-        # Call the termination method
-        subprocess_handler._terminate_process(mock_process)
+        # The whole retry budget is spent in a single wait
+        mock_wait.assert_called_once_with(fake_process, 2 * 0.1)
 
         # Verify termination and kill were called
-        mock_process.terminate.assert_called_once()
-        mock_process.kill.assert_called_once()
+        assert fake_process.terminate_calls == 1
+        assert fake_process.kill_calls == 1
 
-    def test_encoding_error_handling(self, subprocess_handler, tmp_path):
-        """Test handling of encoding errors."""
-        # Create a file with non-UTF8 content using binary mode
-        test_file = tmp_path / "test_file.txt"
-        with open(test_file, "wb") as f:
-            f.write(b"\x80\x81\x82")  # Write binary data directly
+    @pytest.mark.skipif(not utils.PIDFD_AVAILABLE, reason="pidfd not available")
+    def test_terminate_process_waits_on_exit(self, subprocess_handler, monkeypatch):
+        """Test _terminate_process returns as soon as the process exits."""
+        process = subprocess.Popen(["sleep", "30"])
+        monkeypatch.setattr(subprocess_handler, "termination_wait", 5)
 
-        # Test reading with text mode - should handle encoding errors
-        if sys.platform == "win32":
-            # On Windows, we need to use shell=True for built-in commands
-            cmd = ["cmd", "/c", "type", str(test_file)]
+        start = time.monotonic()
+        subprocess_handler._terminate_process(process)
+
+        assert time.monotonic() - start < 5
+        assert process.returncode is not None
+
+    @pytest.mark.skipif(
+            not utils.PIDFD_SIGNAL_AVAILABLE, reason="pidfd signals not available"
+    )
+    def test_terminate_process_signals_through_pidfd(self, subprocess_handler):
+        """Test _terminate_process signals a live process through its pidfd."""
+        process = subprocess.Popen(["sleep", "30"])
+
+        with patch(
+                "signal.pidfd_send_signal", wraps=signal.pidfd_send_signal
+        ) as mock_send:
+            subprocess_handler._terminate_process(process)
+
+        mock_send.assert_called_once_with(ANY, signal.SIGTERM)
+        assert process.wait(timeout=5) == -signal.SIGTERM
+
+    @requires_psutil
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups only")
+    def test_terminate_process_group_kills_grandchildren(self):
+        """Test new_process_group takes a shell's background children down too."""
+        handler = SubprocessHandler(termination_wait=0.1, new_process_group=True)
+        process = handler._start_process(
+            ["sh", "-c", "sleep 60 & echo $!; wait"], {"stdout": subprocess.PIPE}
+        )
+        grandchild = psutil.Process(int(process.stdout.readline()))
+
+        handler._cleanup_process(process)
+
+        # Once orphaned, the grandchild may linger as a zombie until reaped
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                if grandchild.status() == psutil.STATUS_ZOMBIE:
+                    break
+            except psutil.NoSuchProcess:
+                break
+            time.sleep(0.01)
         else:
-            cmd = ["cat", str(test_file)]
+            grandchild.kill()
+            pytest.fail("grandchild outlived its process group")
 
-        stdout, stderr, returncode = subprocess_handler.run_command(cmd)
+    def test_encoding_error_handling(self, subprocess_handler, non_utf8_file):
+        """Test handling of encoding errors."""
+        # Test reading with text mode - should handle encoding errors
+        stdout, stderr, returncode = subprocess_handler.run_command(
+            [*CAT_FILE_CMD, str(non_utf8_file)]
+        )
         assert returncode == 0
         assert isinstance(
             stdout, str
@@ -265,6 +482,36 @@ class TestSubprocessHandler:
         with pytest.raises(TimeoutError, match="Command timed out after 2 seconds"):
             subprocess_handler._handle_timeout(mock_process, ECHO_CMD, 2)
 
+    def test_handle_timeout_already_dead(self, subprocess_handler, mock_process):
+        """Test _handle_timeout skips termination for an already killed process."""
+        with pytest.raises(TimeoutError):
+            subprocess_handler._handle_timeout(
+                mock_process, ECHO_CMD, 2, already_dead=True
+            )
+
+        mock_process.terminate.assert_not_called()
+
+    def test_timeout_kills_process_once(self, subprocess_handler, mock_process):
+        """Test a communicate timeout kills the process instead of terminating it."""
+        mock_process.communicate.side_effect = subprocess.TimeoutExpired(
+            SLEEP_CMD, 0.1
+        )
+        # Once killed, the process reports that it has exited
+        mock_process.kill.side_effect = lambda: setattr(
+            mock_process.poll, "return_value", -9
+        )
+
+        with patch("subprocess.Popen", return_value=mock_process), patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
+            with pytest.raises(TimeoutError):
+                subprocess_handler.run_command(SLEEP_CMD, timeout=0.1)
+
+        mock_process.kill.assert_called_once()
+        # The kill is followed by a single wait on the process's exit
+        mock_wait.assert_called_once_with(mock_process, 0.1)
+        mock_process.terminate.assert_not_called()
+
     def test_handle_execution_error(self, subprocess_handler, mock_process):
         """Test _handle_execution_error method."""
         test_error = OSError("Test error")
@@ -338,19 +585,19 @@ class TestSubprocessHandler:
         mock_process.stdout.close.assert_called_once()
         mock_process.stderr.close.assert_called_once()
 
-    def test_terminate_process_with_oserror(self, subprocess_handler, mock_process):
+    def test_terminate_process_with_oserror(self, subprocess_handler, fake_process):
         """Test _terminate_process method with OSError during termination."""
-        # Configure mock to raise OSError during terminate
-        mock_process.terminate.side_effect = OSError("Terminate failed")
+        # Configure the fake to raise OSError during terminate
+        fake_process.terminate_error = OSError("Terminate failed")
 
         # Should not raise any exceptions
-        subprocess_handler._terminate_process(mock_process)
+        subprocess_handler._terminate_process(fake_process)
 
         # Verify terminate was called
-        mock_process.terminate.assert_called_once()
+        assert fake_process.terminate_calls == 1
 
-        # Verify kill was not called (since poll returns None)
-        mock_process.kill.assert_not_called()
+        # Verify kill was not called (since terminate raised)
+        assert fake_process.kill_calls == 0
 
     def test_handle_execution_error_with_termination_error(
             self, subprocess_handler, mock_process
@@ -368,14 +615,14 @@ class TestSubprocessHandler:
         # Verify termination was attempted
         mock_process.terminate.assert_called_once()
 
+    @requires_psutil
     def test_terminate_process_with_psutil_error(
             self, subprocess_handler, mock_process
     ):
         """Test _terminate_process when psutil raises an exception."""
-        if not PSUTIL_AVAILABLE:
-            pytest.skip("psutil not available")
-
-        with patch("psutil.Process") as mock_psutil:
+        with patch("psutil.Process") as mock_psutil, patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
             mock_psutil.side_effect = Exception("psutil error")
 
             # Should fall back to standard termination
@@ -383,18 +630,19 @@ class TestSubprocessHandler:
 
             # Verify standard termination was attempted
             mock_process.terminate.assert_called_once()
+            mock_wait.assert_called_once_with(mock_process, 2 * 0.1)
 
+    @requires_psutil
     def test_monitor_process_tree_with_psutil_error(
             self, subprocess_handler, mock_process
     ):
         """Test _monitor_process_tree when psutil raises an exception."""
-        if not PSUTIL_AVAILABLE:
-            pytest.skip("psutil not available")
-
         # Simulate a call that would use poll
         mock_process.poll.return_value = None  # Process is still running
 
-        with patch("psutil.Process") as mock_psutil:
+        with patch("psutil.Process") as mock_psutil, patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
             mock_psutil.side_effect = Exception("psutil error")
 
             # The subprocess_handler doesn't have _monitor_process_tree, so we just verify
@@ -403,6 +651,7 @@ class TestSubprocessHandler:
 
             # Verify process was still monitored
             mock_process.poll.assert_called()
+            mock_wait.assert_called_once_with(mock_process, 2 * 0.1)
 
     def test_process_output_binary_mode_with_non_bytes(
             self, secure_subprocess, mock_process
@@ -460,6 +709,23 @@ class TestSecureSubprocess:
         assert custom_secure.enable_shell is True
         assert custom_secure.restricted_env is False
 
+    def test_allowed_commands_snapshot(self):
+        """Test allowed_commands is frozen, unaffected by later changes to its set."""
+        allowed = {"echo"}
+        secure = SecureSubprocess(SubprocessConfig(allowed_commands=allowed))
+        allowed.add("rm")
+
+        assert isinstance(secure.allowed_commands, frozenset)
+        assert secure.validate_command(["rm", "-rf", "build"]) is False
+
+        # Assigning a new set freezes it as well
+        allowed = {"echo"}
+        secure.allowed_commands = allowed
+        allowed.add("rm")
+
+        assert secure.allowed_commands == frozenset({"echo"})
+        assert secure.validate_command(["rm", "-rf", "build"]) is False
+
     def test_initialization_invalid_working_dir(self):
         """Test initialization with invalid working directory."""
         with pytest.raises(ValueError):
@@ -476,10 +742,7 @@ class TestSecureSubprocess:
         # Restricted environment should have only essential variables
         # Check that it contains only the expected essential variables
         essential_vars = {"PATH", "PYTHONIOENCODING", "LANG", "LC_ALL"}
-
-        # Add Windows-specific variables if on Windows
-        if sys.platform == "win32":
-            essential_vars.update({"SYSTEMROOT", "TEMP", "TMP", "PATHEXT", "COMSPEC"})
+        essential_vars.update(PLATFORM_ENV_VARS)
 
         # Check that all keys in env are either essential or present in os.environ
         for key in env:
@@ -509,46 +772,39 @@ class TestSecureSubprocess:
         for key in os.environ:
             assert key in env
 
-    def test_validate_command_allowed(self, secure_subprocess):
+    def test_validate_command_allowed(self, secure_subprocess, monkeypatch):
         """Test command validation with allowed commands."""
         # With empty allowed_commands, all commands should be allowed
         assert secure_subprocess.validate_command(ECHO_CMD) is True
         assert secure_subprocess.validate_command(NOT_EXIST_CMD) is True
 
         # Test with restricted allowed commands
-        secure_subprocess.allowed_commands = {"echo", "cmd"}  # Allow both echo and cmd
-        if sys.platform == "win32":
-            # On Windows, the command would be cmd.exe
-            assert (
-                    secure_subprocess.validate_command(["cmd", "/c", "echo", "test"])
-                    is True
-            )
-        else:
-            assert secure_subprocess.validate_command(["echo", "test"]) is True
+        # Allow both echo and cmd
+        monkeypatch.setattr(secure_subprocess, "allowed_commands", {"echo", "cmd"})
+        assert secure_subprocess.validate_command([*ECHO_PREFIX, "test"]) is True
         assert secure_subprocess.validate_command(["ls"]) is False
 
     def test_validate_command_empty(self, secure_subprocess):
         """Test command validation with empty command list."""
         assert secure_subprocess.validate_command([]) is False
 
-    def test_sanitize_command(self, secure_subprocess):
+    @pytest.mark.parametrize(
+        ("platform", "arg", "dangerous"),
+        [
+            pytest.param("win32", "hello & del file.txt", "&", id="windows"),
+            pytest.param("linux", "hello; rm -rf /", ";", id="posix"),
+        ],
+    )
+    def test_sanitize_command(self, secure_subprocess, platform, arg, dangerous):
         """Test command sanitization."""
         # Test basic command
         cmd = ["echo", "hello"]
-        sanitized = secure_subprocess.sanitize_command(cmd)
+        sanitized = secure_subprocess.sanitize_command(cmd, platform)
         assert sanitized == cmd
 
         # Test command with potentially dangerous characters
-        if sys.platform == "win32":
-            # Windows-specific dangerous characters
-            cmd = ["echo", "hello & del file.txt"]
-            sanitized = secure_subprocess.sanitize_command(cmd)
-            assert "&" not in sanitized[1]
-        else:
-            # Unix-specific dangerous characters
-            cmd = ["echo", "hello; rm -rf /"]
-            sanitized = secure_subprocess.sanitize_command(cmd)
-            assert ";" not in sanitized[1]
+        sanitized = secure_subprocess.sanitize_command(["echo", arg], platform)
+        assert dangerous not in sanitized[1]
 
     def test_run_command_success(self, secure_subprocess):
         """Test successful command execution with SecureSubprocess."""
@@ -557,35 +813,44 @@ class TestSecureSubprocess:
         assert stderr == ""
         assert returncode == 0
 
-    def test_run_command_not_allowed(self, restricted_secure_subprocess):
+    def test_run_command_not_allowed(self, restricted_secure_subprocess, monkeypatch):
         """Test execution of disallowed command."""
         # Set a command that's not in the allowed list
-        restricted_secure_subprocess.allowed_commands = {"not_echo"}
+        monkeypatch.setattr(
+            restricted_secure_subprocess, "allowed_commands", frozenset({"not_echo"})
+        )
 
         with pytest.raises(ValueError, match="Command not allowed"):
             restricted_secure_subprocess.run_command(ECHO_CMD)
 
-    def test_output_truncation(self, secure_subprocess):
+    def test_run_command_for_status_validates(self, restricted_secure_subprocess):
+        """Test run_command_for_status applies the allow list like run_command."""
+        assert restricted_secure_subprocess.run_command_for_status(ECHO_CMD) == 0
+
+        # A denied command is rejected before its environment is built
+        with pytest.raises(ValueError, match="Command not allowed"), patch.object(
+                restricted_secure_subprocess, "create_env"
+        ) as mock_env:
+            restricted_secure_subprocess.run_command_for_status(["rm", "-rf", "x"])
+        mock_env.assert_not_called()
+
+    def test_output_truncation(self, secure_subprocess, monkeypatch):
         """Test output truncation for large outputs."""
         # Create a command that generates output larger than max_output_size
-        secure_subprocess.max_output_size = 10  # Set very small for testing
-
-        # Create a command that generates more output
-        if sys.platform == "win32":
-            cmd = [
-                "cmd",
-                "/c",
-                "echo",
-                "This is a longer output that should be truncated",
-            ]
-        else:
-            cmd = ["echo", "This is a longer output that should be truncated"]
+        # Set very small for testing
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
 
+        # Generate output spanning several pipe reads, so the cap is applied
+        # while streaming rather than to a single short chunk
+        size = utils._READ_CHUNK_SIZE * 4
+        cmd = [sys.executable, "-c", f"print('0' * {size}, end='')"]
         stdout, stderr, returncode = secure_subprocess.run_command(cmd)
 
         # Output should be truncated
         assert len(stdout) <= secure_subprocess.max_output_size + len("... (truncated)")
+        assert stdout.startswith("0" * secure_subprocess.max_output_size)
         assert "truncated" in stdout
+        assert returncode == 0
 
     def test_working_directory(self, tmp_path):
         """Test subprocess execution with custom working directory."""
@@ -597,12 +862,7 @@ class TestSecureSubprocess:
         test_file = create_temp_file(tmp_path)
 
         # Run command to list files in current directory
-        if sys.platform == "win32":
-            cmd = ["cmd", "/c", "dir"]
-        else:
-            cmd = ["ls"]
-
-        stdout, stderr, returncode = secure.run_command(cmd)
+        stdout, stderr, returncode = secure.run_command(LIST_DIR_CMD)
 
         # Output should contain our test file
         assert test_file.name in stdout
@@ -614,23 +874,17 @@ class TestSecureSubprocess:
         secure = SecureSubprocess(config)
 
         # Run a shell command that should work on both platforms
-        if sys.platform == "win32":
-            cmd = [
-                "echo",
-                "test",
-            ]  # Simple command that works with shell=True on Windows
-        else:
-            cmd = ["echo", "test"]  # Simple command that works with shell=True on Unix
-
-        stdout, stderr, returncode = secure.run_command(cmd)
+        stdout, stderr, returncode = secure.run_command(["echo", "test"])
 
         # Should execute the command through the shell
         assert returncode == 0
         # The output should contain our test string
         assert "test" in stdout
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_resource_monitoring(self, mock_psutil_process, mock_process):
+    @requires_psutil
+    def test_resource_monitoring(
+            self, mock_psutil_process, mock_process, monitor_scheduler
+    ):
         """Test process resource monitoring if psutil is available."""
         # Create a secure subprocess with resource limits
         config = SubprocessConfig(
@@ -640,20 +894,24 @@ class TestSecureSubprocess:
         )
         secure = SecureSubprocess(config)
 
-        # Start a process
-        with patch("subprocess.Popen") as mock_popen:
+        # Start a process, monitored by a scheduler this test stops, since the
+        # mock process never exits
+        with patch("subprocess.Popen") as mock_popen, patch.object(
+                secure, "_communicate_with_process", return_value=(b"output", b"error")
+        ), patch.object(secure, "_apply_rlimits"), patch.object(
+                utils._MonitorScheduler, "instance", return_value=monitor_scheduler
+        ):
             mock_process = mock_popen.return_value
             mock_process.pid = 12345
             mock_process.poll.return_value = None
-            mock_process.communicate.return_value = (b"output", b"error")
 
             # Run the command
             stdout, stderr, returncode = secure.run_command(ECHO_CMD)
 
-            # Verify psutil.Process was called
-            mock_psutil_process.assert_called_with(12345)
+            # psutil.Process is built once for the run, not on every sample
+            mock_psutil_process.assert_called_once_with(12345)
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_cpu_limit_exceeded(self, mock_psutil_process, mock_process):
         """Test CPU limit enforcement if psutil is available."""
         # Configure mock psutil to report high CPU usage
@@ -668,27 +926,27 @@ class TestSecureSubprocess:
         )
         secure = SecureSubprocess(config)
 
-        # Start monitoring in a thread to simulate background monitoring
-        with patch("threading.Thread") as mock_thread:
-            mock_thread_instance = mock_thread.return_value
+        # Intercept registration with the shared monitor scheduler
+        with patch.object(utils._MonitorScheduler, "register") as mock_register:
 
             # Run the command
-            with patch("subprocess.Popen") as mock_popen:
+            with patch("subprocess.Popen") as mock_popen, patch.object(
+                    secure,
+                    "_communicate_with_process",
+                    side_effect=subprocess.TimeoutExpired(cmd=ECHO_CMD, timeout=2),
+            ), patch.object(secure, "_apply_rlimits"):
                 mock_process = mock_popen.return_value
                 mock_process.pid = 12345
                 mock_process.poll.return_value = None
-                mock_process.communicate.side_effect = subprocess.TimeoutExpired(
-                    cmd=ECHO_CMD, timeout=2
-                )
 
                 with pytest.raises(TimeoutError):
                     secure.run_command(ECHO_CMD)
 
-                # Verify thread was started for monitoring
-                mock_thread.assert_called()
-                mock_thread_instance.start.assert_called_once()
+                # Verify the process was registered for monitoring
+                mock_register.assert_called_once()
+                assert mock_register.call_args.args[0].process is mock_process
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_memory_limit_exceeded(self, mock_psutil_process, mock_process):
         """Test memory limit enforcement if psutil is available."""
         # Configure mock psutil to report high memory usage
@@ -705,34 +963,82 @@ class TestSecureSubprocess:
         )
         secure = SecureSubprocess(config)
 
-        # Start monitoring in a thread to simulate background monitoring
-        with patch("threading.Thread") as mock_thread:
-            mock_thread_instance = mock_thread.return_value
+        # Intercept registration with the shared monitor scheduler
+        with patch.object(utils._MonitorScheduler, "register") as mock_register:
 
             # Run the command
-            with patch("subprocess.Popen") as mock_popen:
+            with patch("subprocess.Popen") as mock_popen, patch.object(
+                    secure,
+                    "_communicate_with_process",
+                    side_effect=subprocess.TimeoutExpired(cmd=ECHO_CMD, timeout=2),
+            ), patch.object(secure, "_apply_rlimits"):
                 mock_process = mock_popen.return_value
                 mock_process.pid = 12345
                 mock_process.poll.return_value = None
-                mock_process.communicate.side_effect = subprocess.TimeoutExpired(
-                    cmd=ECHO_CMD, timeout=2
-                )
 
                 with pytest.raises(TimeoutError):
                     secure.run_command(ECHO_CMD)
 
-                # Verify thread was started for monitoring
-                mock_thread.assert_called()
-                mock_thread_instance.start.assert_called_once()
+                # Verify the process was registered for monitoring
+                mock_register.assert_called_once()
+                assert mock_register.call_args.args[0].process is mock_process
 
+    @pytest.mark.skipif(not utils.PRLIMIT_AVAILABLE, reason="prlimit not available")
+    def test_apply_rlimits(self, mock_process):
+        """Test _apply_rlimits caps CPU time at cpu_limit percent of the timeout."""
+        secure = SecureSubprocess(SubprocessConfig(timeout=30, cpu_limit=10.0))
+
+        with patch("resource.prlimit") as mock_prlimit:
+            secure._apply_rlimits(mock_process, None)
+            mock_prlimit.assert_called_once_with(
+                12345, utils.resource.RLIMIT_CPU, (3, 4)
+            )
+
+            # No CPU limit means no kernel limit either
+            mock_prlimit.reset_mock()
+            secure.cpu_limit = None
+            secure._apply_rlimits(mock_process, None)
+            mock_prlimit.assert_not_called()
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups only")
+    def test_terminate_process_group(self, mock_process):
+        """Test new_process_group terminates the whole group with killpg."""
+        secure = SecureSubprocess(
+            SubprocessConfig(new_process_group=True, termination_wait=0.01)
+        )
+        assert secure._prepare_binary_mode_kwargs()["start_new_session"] is True
+
+        with patch("os.killpg") as mock_killpg, patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
+            secure._terminate_process(mock_process)
+
+        assert mock_killpg.call_args_list == [
+            ((12345, signal.SIGTERM),),
+            ((12345, signal.SIGKILL),),
+        ]
+        mock_wait.assert_called_once_with(
+            mock_process, secure.max_termination_retries * secure.termination_wait
+        )
+        mock_process.terminate.assert_not_called()
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups only")
+    def test_terminate_process_group_falls_back(self, mock_process):
+        """Test a missing process group falls back to standard termination."""
+        secure = SecureSubprocess(SubprocessConfig(new_process_group=True))
+
+        with patch("os.killpg", side_effect=ProcessLookupError), patch.object(
+                secure.termination_handler, "terminate_process"
+        ) as mock_terminate:
+            secure._terminate_process(mock_process)
+
+        mock_terminate.assert_called_once()
+
+    @requires_psutil
     def test_terminate_process_enhanced(
             self, restricted_secure_subprocess, mock_process
     ):
         """Test enhanced process termination in SecureSubprocess."""
-        if not PSUTIL_AVAILABLE:
-            # Skip psutil-specific tests if not available
-            return
-
         with patch("psutil.Process") as mock_psutil:
             mock_psutil_instance = mock_psutil.return_value
 
@@ -758,47 +1064,46 @@ class TestSecureSubprocess:
 
     def test_timeout_handling(self, secure_subprocess, mock_process):
         """Test timeout handling during process execution."""
-        with patch("subprocess.Popen") as mock_popen:
+        # Mock the _terminate_process method to ensure it's called
+        mock_terminate = MagicMock()
+        with patch("subprocess.Popen") as mock_popen, patch.multiple(
+                secure_subprocess,
+                _communicate_with_process=MagicMock(
+                    side_effect=subprocess.TimeoutExpired(cmd=ECHO_CMD, timeout=1)
+                ),
+                _terminate_process=mock_terminate,
+        ):
             mock_process = mock_popen.return_value
-            mock_process.communicate.side_effect = subprocess.TimeoutExpired(
-                cmd=ECHO_CMD, timeout=1
-            )
             mock_process.poll.return_value = None  # Process is still running
 
-            # Mock the _terminate_process method to ensure it's called
-            with patch.object(
-                    secure_subprocess, "_terminate_process"
-            ) as mock_terminate:
-                # Should convert to TimeoutError
-                with pytest.raises(TimeoutError):
-                    secure_subprocess.run_command(ECHO_CMD, timeout=1)
+            # Should convert to TimeoutError
+            with pytest.raises(TimeoutError):
+                secure_subprocess.run_command(ECHO_CMD, timeout=1)
 
-                # Should have tried to terminate the process at least once with the mock process
-                mock_terminate.assert_any_call(mock_process)
-                assert mock_terminate.call_count > 0
+            # Should have tried to terminate the process at least once with the mock process
+            mock_terminate.assert_any_call(mock_process)
+            assert mock_terminate.call_count > 0
 
     def test_handle_win32_env(self, secure_subprocess):
         """Test _handle_win32_env method."""
         env = {}
 
         # Test on Windows
-        with patch("sys.platform", "win32"):
-            secure_subprocess._handle_win32_env(env)
-            assert "SYSTEMROOT" in env
-            assert "TEMP" in env
-            assert "TMP" in env
-            assert "PATHEXT" in env
-            assert "COMSPEC" in env
+        secure_subprocess._handle_win32_env(env, platform="win32")
+        assert "SYSTEMROOT" in env
+        assert "TEMP" in env
+        assert "TMP" in env
+        assert "PATHEXT" in env
+        assert "COMSPEC" in env
 
         # Test on non-Windows
         env = {}
-        with patch("sys.platform", "linux"):
-            secure_subprocess._handle_win32_env(env)
-            assert "SYSTEMROOT" not in env
-            assert "TEMP" not in env
-            assert "TMP" not in env
-            assert "PATHEXT" not in env
-            assert "COMSPEC" not in env
+        secure_subprocess._handle_win32_env(env, platform="linux")
+        assert "SYSTEMROOT" not in env
+        assert "TEMP" not in env
+        assert "TMP" not in env
+        assert "PATHEXT" not in env
+        assert "COMSPEC" not in env
 
     def test_get_env(self, secure_subprocess):
         """Test _get_env method."""
@@ -810,19 +1115,40 @@ class TestSecureSubprocess:
         assert "LC_ALL" in env
         assert env["PYTHONIOENCODING"] == "utf-8"
 
-    def test_validate_command_windows(self, secure_subprocess):
+    def test_restricted_env_built_once(self):
+        """Test the restricted environment is built at init, then only copied."""
+        handle_win32_env = SecureSubprocess._handle_win32_env
+        with patch.object(
+                SecureSubprocess, "_handle_win32_env", wraps=handle_win32_env
+        ) as mock_win32_env:
+            secure = SecureSubprocess(SubprocessConfig())
+            first, second = secure.create_env(), secure.create_env()
+
+        mock_win32_env.assert_called_once()
+        assert first == second == dict(secure._get_env())
+        assert first is not second
+
+    def test_validate_command_windows(self, secure_subprocess, monkeypatch):
         """Test validate_command method on Windows."""
-        with patch("sys.platform", "win32"):
-            # Test with .exe extension
-            assert secure_subprocess.validate_command(["echo.exe", "test"]) is True
+        validate = secure_subprocess.validate_command
+
+        # Test with .exe extension
+        assert validate(["echo.exe", "test"], platform="win32") is True
 
-            # Test with .bat extension
-            assert secure_subprocess.validate_command(["script.bat", "test"]) is True
+        # Test with .bat extension
+        assert validate(["script.bat", "test"], platform="win32") is True
 
-            # Test with restricted commands
-            secure_subprocess.allowed_commands = {"echo"}
-            assert secure_subprocess.validate_command(["echo.exe", "test"]) is True
-            assert secure_subprocess.validate_command(["cmd.exe", "test"]) is False
+        # Test with restricted commands
+        monkeypatch.setattr(secure_subprocess, "allowed_commands", {"echo"})
+        assert validate(["echo.exe", "test"], platform="win32") is True
+        assert validate(["cmd.exe", "test"], platform="win32") is False
+
+    def test_base_command(self):
+        """Test the base command drops the directory, and the extension on Windows."""
+        assert utils._base_command("/usr/bin/git", "linux") == "git"
+        assert utils._base_command("script.bat", "linux") == "script.bat"
+        assert utils._base_command("script.bat", "win32") == "script"
+        assert utils._base_command(".hidden", "win32") == ".hidden"
 
     def test_sanitize_command_empty(self, secure_subprocess):
         """Test sanitize_command method with empty command."""
@@ -830,25 +1156,23 @@ class TestSecureSubprocess:
 
     def test_sanitize_command_windows(self, secure_subprocess):
         """Test sanitize_command method on Windows."""
-        with patch("sys.platform", "win32"):
-            # Test with dangerous characters
-            cmd = ["echo", "hello & del file.txt | dir"]
-            sanitized = secure_subprocess.sanitize_command(cmd)
+        # Test with dangerous characters
+        cmd = ["echo", "hello & del file.txt | dir"]
+        sanitized = secure_subprocess.sanitize_command(cmd, platform="win32")
 
-            assert sanitized[0] == "echo"
-            assert "&" not in sanitized[1]
-            assert "|" not in sanitized[1]
+        assert sanitized[0] == "echo"
+        assert "&" not in sanitized[1]
+        assert "|" not in sanitized[1]
 
     def test_sanitize_command_unix(self, secure_subprocess):
         """Test sanitize_command method on Unix."""
-        with patch("sys.platform", "linux"):
-            # Test with dangerous characters
-            cmd = ["echo", "hello; rm -rf / | cat"]
-            sanitized = secure_subprocess.sanitize_command(cmd)
+        # Test with dangerous characters
+        cmd = ["echo", "hello; rm -rf / | cat"]
+        sanitized = secure_subprocess.sanitize_command(cmd, platform="linux")
 
-            assert sanitized[0] == "echo"
-            assert ";" not in sanitized[1]
-            assert "|" not in sanitized[1]
+        assert sanitized[0] == "echo"
+        assert ";" not in sanitized[1]
+        assert "|" not in sanitized[1]
 
     def test_start_resource_monitoring_no_psutil(self, secure_subprocess, mock_process):
         """Test _start_resource_monitoring method when psutil is not available."""
@@ -860,10 +1184,12 @@ class TestSecureSubprocess:
             with patch("threading.Thread") as mock_thread:
                 assert not mock_thread.called
 
-    def test_start_resource_monitoring_no_limits(self, secure_subprocess, mock_process):
+    def test_start_resource_monitoring_no_limits(
+            self, secure_subprocess, mock_process, monkeypatch
+    ):
         """Test _start_resource_monitoring method when no limits are set."""
-        secure_subprocess.cpu_limit = None
-        secure_subprocess.memory_limit = None
+        monkeypatch.setattr(secure_subprocess, "cpu_limit", None)
+        monkeypatch.setattr(secure_subprocess, "memory_limit", None)
 
         # Should not raise any exceptions
         secure_subprocess._start_resource_monitoring(mock_process)
@@ -883,10 +1209,10 @@ class TestSecureSubprocess:
         with patch("threading.Thread") as mock_thread:
             assert not mock_thread.called
 
-    def test_truncate_output_string(self, secure_subprocess):
+    def test_truncate_output_string(self, secure_subprocess, monkeypatch):
         """Test _truncate_output method with string output."""
         # Set small max output size
-        secure_subprocess.max_output_size = 10
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
 
         # Test with string that exceeds max size
         output = "This is a long string that should be truncated"
@@ -901,10 +1227,10 @@ class TestSecureSubprocess:
 
         assert truncated == "Short"
 
-    def test_truncate_output_bytes(self, secure_subprocess):
+    def test_truncate_output_bytes(self, secure_subprocess, monkeypatch):
         """Test _truncate_output method with bytes output."""
         # Set small max output size
-        secure_subprocess.max_output_size = 10
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
 
         # Test with bytes that exceeds max size
         output = b"This is a long string that should be truncated"
@@ -919,50 +1245,92 @@ class TestSecureSubprocess:
 
         assert truncated == b"Short"
 
-    def test_add_optional_popen_args(self, secure_subprocess):
+    def test_truncate_output_bytes_like(self, secure_subprocess, monkeypatch):
+        """Test _truncate_output accepts bytearray and memoryview output."""
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
+        output = b"This is a long string that should be truncated"
+
+        for buffer in (bytearray(output), memoryview(output)):
+            assert secure_subprocess._truncate_output(buffer) == b"This is a ... (truncated)"
+
+        assert secure_subprocess._truncate_output(bytearray(b"Short")) == b"Short"
+
+    def test_decode_truncated(self, secure_subprocess, monkeypatch):
+        """Test _decode_truncated decodes only the kept prefix."""
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
+
+        output = b"This is a long string that should be truncated"
+        decoded = secure_subprocess._decode_truncated(output, "utf-8", "replace")
+        assert decoded == "This is a ... (truncated)"
+
+        assert secure_subprocess._decode_truncated(b"Short", "utf-8", "replace") == "Short"
+        assert secure_subprocess._decode_truncated("Short", "utf-8", "replace") == "Short"
+
+    def test_decode_bytes_like(self, secure_subprocess, monkeypatch):
+        """Test both decoders accept bytearray and memoryview output."""
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 10)
+        output = b"This is a long string\r\n"
+
+        for buffer in (bytearray(output), memoryview(output)):
+            expected = "This is a ... (truncated)"
+            assert secure_subprocess._decode_truncated(buffer, "utf-8", "strict") == (
+                expected
+            )
+            assert secure_subprocess._decode_text(buffer, "utf-8", "strict") == (
+                expected
+            )
+        crlf = bytearray(b"a\r\n")
+        assert secure_subprocess._decode_text(crlf, "utf-8", "strict") == "a\n"
+
+    def test_decode_text(self, secure_subprocess, monkeypatch):
+        """Test _decode_text translates newlines and never splits a character."""
+        monkeypatch.setattr(secure_subprocess, "max_output_size", 5)
+
+        # Five bytes end in the middle of the third two-byte character
+        output = "é".encode() * 4
+        assert secure_subprocess._decode_text(output, "utf-8", "strict") == "éé... (truncated)"
+
+        assert secure_subprocess._decode_text(b"a\r\nb", "utf-8", "strict") == "a\nb"
+
+    def test_add_optional_popen_args(self, secure_subprocess, monkeypatch):
         """Test _add_optional_popen_args method."""
         popen_kwargs = {}
 
         # Test with working directory
-        secure_subprocess.working_dir = Path("/test/dir")
+        monkeypatch.setattr(secure_subprocess, "working_dir", Path("/test/dir"))
         secure_subprocess._add_optional_popen_args(popen_kwargs)
         assert popen_kwargs["cwd"] == Path("/test/dir")
 
         # Test with shell enabled
         popen_kwargs = {}
-        secure_subprocess.enable_shell = True
+        monkeypatch.setattr(secure_subprocess, "enable_shell", True)
         secure_subprocess._add_optional_popen_args(popen_kwargs)
         assert popen_kwargs["shell"] is True
 
         # Test with both
         popen_kwargs = {}
-        secure_subprocess.working_dir = Path("/test/dir")
-        secure_subprocess.enable_shell = True
+        monkeypatch.setattr(secure_subprocess, "working_dir", Path("/test/dir"))
+        monkeypatch.setattr(secure_subprocess, "enable_shell", True)
         secure_subprocess._add_optional_popen_args(popen_kwargs)
         assert popen_kwargs["cwd"] == Path("/test/dir")
         assert popen_kwargs["shell"] is True
 
     def test_secure_subprocess_execute_with_exception(self, secure_subprocess):
         """Test SecureSubprocess execute with an exception."""
-        # We need to patch _execute_subprocess directly since it's the method that catches exceptions
-        with patch.object(
-                secure_subprocess, "_execute_subprocess", return_value=("", "", -1)
+        # Patch _execute_subprocess directly since it's the method that catches
+        # exceptions, and _prepare_command to avoid validation errors
+        with patch.multiple(
+                secure_subprocess,
+                _execute_subprocess=MagicMock(return_value=("", "", -1)),
+                _prepare_command=MagicMock(return_value=ECHO_CMD),
+                _prepare_text_mode_kwargs=MagicMock(return_value={}),
         ):
-            # Need to patch _prepare_command to avoid validation error
-            with patch.object(
-                    secure_subprocess, "_prepare_command", return_value=ECHO_CMD
-            ):
-                # Set up mock for _prepare_text_mode_kwargs
-                with patch.object(
-                        secure_subprocess, "_prepare_text_mode_kwargs", return_value={}
-                ):
-                    # Call _run_secure_subprocess
-                    result = secure_subprocess._run_secure_subprocess(
-                        ECHO_CMD, is_text_mode=True
-                    )
-
-                    # Verify return values
-                    assert result == ("", "", -1)
+            result = secure_subprocess._run_secure_subprocess(
+                ECHO_CMD, is_text_mode=True
+            )
+
+            # Verify return values
+            assert result == ("", "", -1)
 
     def test_file_change_with_invalid_path(self):
         """Test FileChange with an invalid file path."""
@@ -1004,32 +1372,24 @@ class TestSecureSubprocess:
 
     def test_process_monitor_with_early_exit(self, mock_process):
         """Test ProcessMonitor when process exits early."""
-        monitor = ProcessMonitor(mock_process)
+        # Run the monitoring loop synchronously instead of on a thread
+        monitor = ProcessMonitor(mock_process, runner=lambda fn: fn())
         mock_process.poll.return_value = 0
 
-        # Start monitoring in a separate thread
-        monitor_thread = threading.Thread(target=monitor.start_monitoring)
-        monitor_thread.start()
-
-        # Wait for monitoring to complete
-        monitor_thread.join(timeout=1.0)
+        monitor.start_monitoring()
 
-        assert not monitor_thread.is_alive()
+        assert not monitor._monitoring
         mock_process.poll.assert_called()
 
     def test_process_monitor_with_error(self, mock_process):
         """Test ProcessMonitor when process raises an error."""
-        monitor = ProcessMonitor(mock_process)
+        # Run the monitoring loop synchronously instead of on a thread
+        monitor = ProcessMonitor(mock_process, runner=lambda fn: fn())
         mock_process.poll.side_effect = OSError("Process error")
 
-        # Start monitoring in a separate thread
-        monitor_thread = threading.Thread(target=monitor.start_monitoring)
-        monitor_thread.start()
+        monitor.start_monitoring()
 
-        # Wait for monitoring to complete
-        monitor_thread.join(timeout=1.0)
-
-        assert not monitor_thread.is_alive()
+        assert not monitor._monitoring
         mock_process.poll.assert_called()
 
     def test_secure_subprocess_termination_with_error(self, mock_process):
@@ -1063,11 +1423,9 @@ class TestSecureSubprocess:
         # exits early from the loop after the first iteration.
         assert mock_process.poll.call_count == 1
 
+    @requires_psutil
     def test_secure_subprocess_termination_with_psutil_error(self, mock_process):
         """Test SecureSubprocessTermination when psutil raises an exception."""
-        if not PSUTIL_AVAILABLE:
-            pytest.skip("psutil not available")
-
         terminator = SecureSubprocessTermination(
             termination_wait=0.01
         )  # Use shorter wait time for testing
@@ -1081,7 +1439,9 @@ class TestSecureSubprocess:
             lambda: poll_return_values.pop(0) if poll_return_values else 0
         )
 
-        with patch("psutil.Process") as mock_psutil:
+        with patch("psutil.Process") as mock_psutil, patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
             mock_psutil.side_effect = Exception("psutil error")
 
             # Call the method under test - should fall back to standard termination
@@ -1090,10 +1450,10 @@ class TestSecureSubprocess:
             # Process should be terminated but not killed (since it terminates after the first attempt)
             mock_process.terminate.assert_called()
 
-            # In this case, poll is called twice:
-            # 1. First in _is_process_already_terminated
-            # 2. Second in _terminate_and_wait
-            assert mock_process.poll.call_count == 2
+            # poll is only called by _is_process_already_terminated;
+            # _terminate_and_wait blocks until exit instead of polling
+            assert mock_process.poll.call_count == 1
+            mock_wait.assert_called_once_with(mock_process, 2 * 0.01)
 
     def test_secure_subprocess_init_with_psutil_warning(self):
         """Test SecureSubprocess initialization with psutil warning."""
@@ -1115,6 +1475,7 @@ class TestSecureSubprocess:
         # Verify the kwargs
         assert kwargs["stdout"] == subprocess.PIPE
         assert kwargs["stderr"] == subprocess.PIPE
+        assert kwargs["bufsize"] == -1
         assert "env" in kwargs
 
         # Verify _add_optional_popen_args was called
@@ -1122,16 +1483,81 @@ class TestSecureSubprocess:
             secure_subprocess._prepare_binary_mode_kwargs()
             mock_add.assert_called_once()
 
-    def test_validate_command_unix(self, secure_subprocess):
+    @pytest.mark.skipif(
+        not getattr(subprocess, "_USE_POSIX_SPAWN", False),
+        reason="posix_spawn is not used by subprocess on this platform",
+    )
+    def test_add_spawn_args(self, secure_subprocess, monkeypatch):
+        """Test commands are resolved to a path so Popen can use posix_spawn."""
+        env_kwargs = {"env": dict(os.environ)}
+
+        # Off by default, so close_fds keeps its default of True
+        assert secure_subprocess._add_spawn_args(ECHO_CMD, env_kwargs) == env_kwargs
+
+        monkeypatch.setattr(secure_subprocess, "use_posix_spawn", True)
+        kwargs = secure_subprocess._add_spawn_args(ECHO_CMD, env_kwargs)
+        assert os.path.isabs(kwargs["executable"])
+        assert kwargs["close_fds"] is False
+
+        # A cwd or new session rules out posix_spawn, so nothing is added
+        for extra in ({"cwd": "."}, {"start_new_session": True}):
+            assert secure_subprocess._add_spawn_args(ECHO_CMD, extra) == extra
+
+        # Unknown commands are left for Popen to report
+        assert secure_subprocess._add_spawn_args(NOT_EXIST_CMD, {}) == {}
+
+        # A path relative to the working directory is used as given
+        local = secure_subprocess._add_spawn_args(["./echo"], {})
+        assert local["executable"] == "./echo"
+
+    @pytest.mark.skipif(
+        not getattr(subprocess, "_USE_POSIX_SPAWN", False),
+        reason="posix_spawn is not used by subprocess on this platform",
+    )
+    def test_run_command_uses_posix_spawn(self, secure_subprocess, monkeypatch):
+        """Test run_command starts the process with posix_spawn when opted in."""
+        monkeypatch.setattr(secure_subprocess, "use_posix_spawn", True)
+        with patch("os.posix_spawn", wraps=os.posix_spawn) as mock_spawn:
+            stdout, _, returncode = secure_subprocess.run_command(ECHO_CMD)
+
+        mock_spawn.assert_called_once()
+        assert "hello" in stdout
+        assert returncode == 0
+
+    def test_prepare_kwargs_share_builder(self, secure_subprocess):
+        """Test text and binary mode both take their kwargs from one builder."""
+        with patch.object(
+                secure_subprocess, "_build_popen_kwargs", return_value={"bufsize": -1}
+        ) as mock_build:
+            assert secure_subprocess._prepare_text_mode_kwargs() == {"bufsize": -1}
+            assert secure_subprocess._prepare_binary_mode_kwargs() == {"bufsize": -1}
+
+        assert mock_build.call_count == 2
+
+    def test_prepare_binary_mode_kwargs_no_capture(
+            self, secure_subprocess, monkeypatch
+    ):
+        """Test _prepare_binary_mode_kwargs discards output when not capturing."""
+        monkeypatch.setattr(secure_subprocess, "capture_output", False)
+        kwargs = secure_subprocess._prepare_binary_mode_kwargs()
+
+        assert kwargs["stdout"] is subprocess.DEVNULL
+        assert kwargs["stderr"] is subprocess.DEVNULL
+
+        # The command still runs, it just produces no output
+        assert secure_subprocess.run_command(ECHO_CMD) == ("", "", 0)
+
+    def test_validate_command_unix(self, secure_subprocess, monkeypatch):
         """Test validate_command method on Unix."""
-        with patch("sys.platform", "linux"):
-            # Test with command without extension
-            assert secure_subprocess.validate_command(["echo", "test"]) is True
+        validate = secure_subprocess.validate_command
+
+        # Test with command without extension
+        assert validate(["echo", "test"], platform="linux") is True
 
-            # Test with restricted commands
-            secure_subprocess.allowed_commands = {"echo"}
-            assert secure_subprocess.validate_command(["echo", "test"]) is True
-            assert secure_subprocess.validate_command(["ls", "test"]) is False
+        # Test with restricted commands
+        monkeypatch.setattr(secure_subprocess, "allowed_commands", {"echo"})
+        assert validate(["echo", "test"], platform="linux") is True
+        assert validate(["ls", "test"], platform="linux") is False
 
 
 # Tests for ProcessResourceMonitor
@@ -1150,14 +1576,14 @@ class TestProcessResourceMonitor:
             terminate_callback=MagicMock(),
         )
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_start_monitoring_no_psutil(self, resource_monitor):
         """Test start_monitoring method when psutil is not available."""
         with patch("c4f.utils.PSUTIL_AVAILABLE", False):
             # Should not raise any exceptions
             resource_monitor.start_monitoring()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_start_monitoring_no_pid(self, resource_monitor):
         """Test start_monitoring method when process has no PID."""
         resource_monitor.process.pid = None
@@ -1165,7 +1591,7 @@ class TestProcessResourceMonitor:
         # Should not raise any exceptions
         resource_monitor.start_monitoring()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_start_monitoring_process_error(self, resource_monitor):
         """Test start_monitoring method when process raises an exception."""
         with patch("psutil.Process") as mock_psutil:
@@ -1174,7 +1600,7 @@ class TestProcessResourceMonitor:
             # Should not raise any exceptions
             resource_monitor.start_monitoring()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_monitor_process_tree_completed(self, resource_monitor):
         """Test _monitor_process_tree method when process completes quickly."""
         # Configure process to complete immediately
@@ -1183,26 +1609,121 @@ class TestProcessResourceMonitor:
         # Should not raise any exceptions
         resource_monitor._monitor_process_tree(MagicMock())
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_monitor_process_tree_children_error(self, resource_monitor):
+    @requires_psutil
+    def test_monitor_process_tree_stops_on_exit(self):
+        """Test _monitor_process_tree returns when the process exits, not later."""
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(0.2)"]
+        )
+        monitor = ProcessResourceMonitor(
+            process=process,
+            cpu_limit=None,
+            memory_limit=1024 ** 3,
+            monitor_interval=10,
+            terminate_callback=MagicMock(),
+        )
+
+        start = time.monotonic()
+        monitor.start_monitoring()
+
+        assert time.monotonic() - start < 5
+        assert process.returncode == 0
+        monitor.terminate_callback.assert_not_called()
+
+    @pytest.mark.skipif(not utils.PIDFD_AVAILABLE, reason="pidfd not available")
+    def test_monitor_process_tree_opens_one_pidfd(self, psutil_process):
+        """Test _monitor_process_tree reuses one pidfd across its samples."""
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(0.3)"]
+        )
+        monitor = ProcessResourceMonitor(
+            process=process,
+            cpu_limit=None,
+            memory_limit=1024 ** 3,
+            monitor_interval=0.05,
+            terminate_callback=MagicMock(),
+        )
+
+        with patch("os.pidfd_open", wraps=os.pidfd_open) as mock_open:
+            monitor._monitor_process_tree(psutil_process)
+
+        assert psutil_process.memory_info.call_count > 1
+        mock_open.assert_called_once_with(process.pid)
+        assert process.returncode == 0
+
+    @requires_psutil
+    def test_monitor_process_tree_children_error(
+            self, resource_monitor, psutil_process
+    ):
         """Test _monitor_process_tree method when children() raises an exception."""
-        mock_psutil_process = MagicMock()
-        mock_psutil_process.children.side_effect = psutil.NoSuchProcess(12345)
+        psutil_process.children.side_effect = psutil.NoSuchProcess(12345)
 
         # Should not raise any exceptions
-        resource_monitor._monitor_process_tree(mock_psutil_process)
+        resource_monitor._monitor_process_tree(psutil_process)
+
+    @requires_psutil
+    def test_sample_enumerates_children_once(self, resource_monitor):
+        """Test _sample lists the whole process tree with one recursive call."""
+        child = MagicMock()
+        child.cpu_percent.return_value = 1.0
+        child.memory_info.return_value = MagicMock(rss=512)
+        mock_psutil_process = MagicMock()
+        mock_psutil_process.cpu_percent.return_value = 1.0
+        mock_psutil_process.memory_info.return_value = MagicMock(rss=512)
+        mock_psutil_process.children.return_value = [child]
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_check_resource_limits_no_exceed(self, resource_monitor):
-        """Test _check_resource_limits method when limits are not exceeded."""
+        assert resource_monitor._sample(mock_psutil_process) is True
+
+        mock_psutil_process.children.assert_called_once_with(recursive=True)
+        child.children.assert_not_called()
+        child.memory_info.assert_called_once()
+
+    @requires_psutil
+    def test_sample_reuses_child_processes(self, resource_monitor):
+        """Test _sample keeps child Process objects so cpu_percent has a baseline."""
         mock_psutil_process = MagicMock()
-        mock_psutil_process.cpu_percent.return_value = 5.0
-        mock_psutil_process.memory_info.return_value = MagicMock(rss=512 * 1024)
+        mock_psutil_process.cpu_percent.return_value = 1.0
+        mock_psutil_process.memory_info.return_value = MagicMock(rss=512)
+        first, again = MagicMock(pid=1), MagicMock(pid=1)
+        for child in (first, again):
+            child.cpu_percent.return_value = 1.0
+            child.memory_info.return_value = MagicMock(rss=512)
+        # The same process, enumerated afresh on the next sample
+        again.__eq__.side_effect = lambda other: other is first
+
+        mock_psutil_process.children.return_value = [first]
+        resource_monitor._sample(mock_psutil_process)
+        mock_psutil_process.children.return_value = [again]
+        resource_monitor._sample(mock_psutil_process)
+
+        assert first.cpu_percent.call_count == 2
+        again.cpu_percent.assert_not_called()
+
+    @requires_psutil
+    def test_check_resource_limits_reads_once(self, resource_monitor, psutil_process):
+        """Test each process is read inside oneshot() without blocking on CPU."""
+        resource_monitor._check_resource_limits(
+            [psutil_process], psutil_process
+        )
+
+        psutil_process.oneshot.assert_called_once_with()
+        psutil_process.cpu_percent.assert_called_once_with(None)
+        psutil_process.memory_info.assert_called_once_with()
+
+        # Metrics without a limit are not read at all
+        resource_monitor.memory_limit = None
+        resource_monitor._check_resource_limits(
+            [psutil_process], psutil_process
+        )
+        psutil_process.memory_info.assert_called_once_with()
 
+    @requires_psutil
+    def test_check_resource_limits_no_exceed(self, resource_monitor, psutil_process):
+        """Test _check_resource_limits method when limits are not exceeded."""
         # Should return False
         assert (
                 resource_monitor._check_resource_limits(
-                    [mock_psutil_process], mock_psutil_process
+                    [psutil_process], psutil_process
                 )
                 is False
         )
@@ -1210,47 +1731,52 @@ class TestProcessResourceMonitor:
         # Verify terminate_callback was not called
         resource_monitor.terminate_callback.assert_not_called()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_check_resource_limits_process_error(self, resource_monitor):
+    @requires_psutil
+    def test_check_resource_limits_process_error(
+            self, resource_monitor, psutil_process
+    ):
         """Test _check_resource_limits method when process raises an exception."""
-        mock_psutil_process = MagicMock()
-        mock_psutil_process.cpu_percent.side_effect = psutil.NoSuchProcess(12345)
+        psutil_process.cpu_percent.side_effect = psutil.NoSuchProcess(12345)
 
         # Should not raise any exceptions
         assert (
                 resource_monitor._check_resource_limits(
-                    [mock_psutil_process], mock_psutil_process
+                    [psutil_process], psutil_process
                 )
                 is False
         )
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_check_cpu_limit_no_limit(self, resource_monitor):
         """Test _check_cpu_limit method when no CPU limit is set."""
         resource_monitor.cpu_limit = None
 
         # Should return False
-        assert resource_monitor._check_cpu_limit(MagicMock(), MagicMock()) is False
+        assert (
+                resource_monitor._check_cpu_limit(MagicMock(), MagicMock(), 100.0)
+                is False
+        )
 
         # Verify terminate_callback was not called
         resource_monitor.terminate_callback.assert_not_called()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_check_memory_limit_no_limit(self, resource_monitor):
         """Test _check_memory_limit method when no memory limit is set."""
         resource_monitor.memory_limit = None
 
         # Should return False
-        assert resource_monitor._check_memory_limit(MagicMock(), MagicMock()) is False
+        assert (
+                resource_monitor._check_memory_limit(MagicMock(), MagicMock(), 1 << 30)
+                is False
+        )
 
         # Verify terminate_callback was not called
         resource_monitor.terminate_callback.assert_not_called()
 
+    @requires_psutil
     def test_process_resource_monitor_with_psutil_error(self, mock_process):
         """Test ProcessResourceMonitor when psutil raises an exception."""
-        if not PSUTIL_AVAILABLE:
-            pytest.skip("psutil not available")
-
         monitor = ProcessResourceMonitor(
             process=mock_process,
             cpu_limit=10.0,
@@ -1263,7 +1789,9 @@ class TestProcessResourceMonitor:
         # the process is still running initially
         mock_process.poll.return_value = None
 
-        with patch("psutil.Process") as mock_psutil:
+        with patch("psutil.Process") as mock_psutil, patch(
+                "c4f.utils._wait_for_exit", return_value=True
+        ) as mock_wait:
             mock_psutil.side_effect = Exception("psutil error")
 
             # Call start_monitoring directly
@@ -1271,10 +1799,11 @@ class TestProcessResourceMonitor:
 
             # When psutil.Process raises an exception, the code should catch it
             # and not proceed to the _monitor_process_tree method where poll() would be called
-            # So we should not expect poll() to be called
+            # So we should not expect poll() to be called, nor any wait for exit
             mock_process.poll.assert_not_called()
+            mock_wait.assert_not_called()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_check_resource_limits_with_multiple_processes(self, resource_monitor):
         """Test _check_resource_limits method with multiple processes."""
         # Create mock processes
@@ -1295,8 +1824,72 @@ class TestProcessResourceMonitor:
         # Verify terminate_callback was called
         resource_monitor.terminate_callback.assert_called_once()
 
+    @requires_psutil
+    def test_monitor_scheduler_uses_one_thread(self, monitor_scheduler):
+        """Test that many monitors share a single scheduler thread."""
+        scheduler = monitor_scheduler
+        threads_before = threading.active_count()
+
+        for _ in range(100):
+            process = MagicMock(spec=subprocess.Popen)
+            process.pid = 12345
+            process.poll.return_value = 0  # Exited, dropped after one sample
+            scheduler.register(
+                ProcessResourceMonitor(
+                    process=process,
+                    cpu_limit=10.0,
+                    memory_limit=None,
+                    monitor_interval=0.1,
+                    terminate_callback=MagicMock(),
+                )
+            )
+
+        assert threading.active_count() <= threads_before + 1
+
+    def test_monitor_scheduler_stop(self, monitor_scheduler, resource_monitor):
+        """Test stop() ends the scheduler thread and refuses new monitors."""
+        monitor_scheduler.register(resource_monitor)
+        thread = monitor_scheduler._thread
+
+        monitor_scheduler.stop(timeout=5)
+
+        assert not thread.is_alive()
+        with pytest.raises(RuntimeError):
+            monitor_scheduler.register(resource_monitor)
+
+    @requires_psutil
+    def test_poll_once_no_pid(self, resource_monitor):
+        """Test poll_once stops monitoring a process without a PID."""
+        resource_monitor.process.pid = None
+        assert resource_monitor.poll_once() is False
+
+    @requires_psutil
+    def test_poll_once_reuses_process(self, resource_monitor, mock_psutil_process):
+        """Test poll_once builds the psutil.Process once, not on every tick."""
+        for _ in range(3):
+            resource_monitor.poll_once()
+
+        mock_psutil_process.assert_called_once_with(12345)
+
+    def test_next_delay_continuous(self, resource_monitor):
+        """Test a monitor without a sampling interval samples every interval."""
+        assert resource_monitor.next_delay(0.0) == 0.1
+        assert resource_monitor.next_delay(100.0) == 0.1
+
+    def test_next_delay_duty_cycle(self, resource_monitor, monkeypatch):
+        """Test a monitor idles for the sampling interval between bursts."""
+        monkeypatch.setattr(resource_monitor, "sampling_interval", 5.0)
+        monkeypatch.setattr(resource_monitor, "burst_duration", 1.0)
+
+        # Burst from 0 to 1, idle until 6, then burst again until 7
+        assert resource_monitor.next_delay(0.0) == 0.1
+        assert resource_monitor.next_delay(0.5) == 0.1
+        assert resource_monitor.next_delay(1.0) == 5.0
+        assert resource_monitor.next_delay(6.0) == 0.1
+        assert resource_monitor.next_delay(7.0) == 5.0
+
     # noinspection PyUnresolvedReferences
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_check_resource_limits_with_exception(self, resource_monitor):
         """Test _check_resource_limits method when a process raises an exception."""
         # Create a mock psutil.Process that raises an exception
@@ -1322,14 +1915,30 @@ class TestSecureSubprocessTermination:
         """Return a SecureSubprocessTermination instance for testing."""
         return SecureSubprocessTermination(termination_wait=0.1)
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
+    def test_ps_process_cache(self, mock_psutil_process):
+        """Test that psutil.Process objects are cached per pid and evicted."""
+        first = utils._get_ps_process(12345)
+        second = utils._get_ps_process(12345)
+        assert first is second
+        mock_psutil_process.assert_called_once_with(12345)
+
+        # A cached process that is no longer running is replaced
+        first.is_running.return_value = False
+        utils._get_ps_process(12345)
+        assert mock_psutil_process.call_count == 2
+
+        utils._evict_ps_process(12345)
+        assert 12345 not in utils._PS_PROCESS_CACHE
+
+    @requires_psutil
     def test_terminate_process_and_children_no_psutil(self, termination_handler):
         """Test terminate_process_and_children method when psutil is not available."""
         with patch("c4f.utils.PSUTIL_AVAILABLE", False):
             # Should not raise any exceptions
             termination_handler.terminate_process_and_children(MagicMock())
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_terminate_process_and_children_process_error(self, termination_handler):
         """Test terminate_process_and_children method when process raises an exception."""
         mock_psutil_process = MagicMock()
@@ -1338,7 +1947,7 @@ class TestSecureSubprocessTermination:
         # Should not raise any exceptions
         termination_handler.terminate_process_and_children(mock_psutil_process)
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_terminate_children_with_error(self, termination_handler):
         """Test _terminate_children method when child process raises an exception."""
         mock_child = MagicMock()
@@ -1347,7 +1956,14 @@ class TestSecureSubprocessTermination:
         # Should not raise any exceptions
         termination_handler._terminate_children([mock_child])
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
+    def test_get_child_processes_is_recursive(self, termination_handler):
+        """Test _get_child_processes fetches all descendants in a single call."""
+        mock_psutil_process = MagicMock()
+        termination_handler._get_child_processes(mock_psutil_process)
+        mock_psutil_process.children.assert_called_once_with(recursive=True)
+
+    @requires_psutil
     def test_kill_remaining_processes_with_error(self, termination_handler):
         """Test _kill_remaining_processes method when process raises an exception."""
         mock_process = MagicMock()
@@ -1378,11 +1994,9 @@ class TestSecureSubprocessTermination:
             # Should fall back to standard termination
             mock_process.terminate.assert_called_once()
 
+    @requires_psutil
     def test_terminate_process_psutil_error(self, termination_handler, mock_process):
         """Test terminate_process method when psutil raises an exception."""
-        if not PSUTIL_AVAILABLE:
-            pytest.skip("psutil not available")
-
         with patch("psutil.Process") as mock_psutil:
             mock_psutil.side_effect = psutil.NoSuchProcess(12345)
 
@@ -1403,29 +2017,52 @@ class TestSecureSubprocessTermination:
 
     def test_terminate_and_wait_completes(self, termination_handler, mock_process):
         """Test _terminate_and_wait method when process completes quickly."""
-        # Configure process to complete after first poll
-        mock_process.poll.side_effect = [None, 0]
-
-        # Should not raise any exceptions
-        termination_handler._terminate_and_wait(mock_process, 3, 0.1)
+        # Configure process to exit as soon as it is waited on
+        with patch("c4f.utils._wait_for_exit", return_value=True) as mock_wait:
+            # Should not raise any exceptions
+            termination_handler._terminate_and_wait(mock_process, 3, 0.1)
 
         # Verify terminate was called but kill was not
         mock_process.terminate.assert_called_once()
         mock_process.kill.assert_not_called()
+        mock_wait.assert_called_once_with(mock_process, 3 * 0.1)
 
     def test_terminate_and_wait_requires_kill(self, termination_handler, mock_process):
         """Test _terminate_and_wait method when process requires kill."""
         # Configure process to never complete
-        mock_process.poll.return_value = None
-
-        # Should not raise any exceptions
-        termination_handler._terminate_and_wait(mock_process, 3, 0.1)
+        with patch("c4f.utils._wait_for_exit", return_value=False):
+            # Should not raise any exceptions
+            termination_handler._terminate_and_wait(mock_process, 3, 0.1)
 
         # Verify both terminate and kill were called
         mock_process.terminate.assert_called_once()
         mock_process.kill.assert_called_once()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @pytest.mark.parametrize("pidfd", [True, False])
+    def test_wait_for_exit(self, pidfd, monkeypatch):
+        """Test _wait_for_exit times out on a live process and reaps an exited one."""
+        monkeypatch.setattr(utils, "PIDFD_AVAILABLE", pidfd and utils.PIDFD_AVAILABLE)
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+        try:
+            assert utils._wait_for_exit(process, 0.05) is False
+            process.kill()
+
+            start = time.monotonic()
+            assert utils._wait_for_exit(process, 5) is True
+            assert time.monotonic() - start < 2
+            assert process.returncode is not None
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_wait_for_exit_already_reaped(self, mock_process):
+        """Test _wait_for_exit never touches the pid of a reaped process."""
+        mock_process.returncode = 0
+
+        assert utils._wait_for_exit(mock_process, 1) is True
+        mock_process.wait.assert_not_called()
+
+    @requires_psutil
     def test_terminate_process_and_children_with_exception(self, termination_handler):
         """Test terminate_process_and_children method when an exception occurs."""
         # Create a mock psutil.Process that raises an exception
@@ -1445,10 +2082,9 @@ class TestSecureSubprocessTermination:
 class TestIntegration:
     """Integration tests that run actual processes."""
 
-    def test_run_command_output_capture(self):
+    def test_run_command_output_capture(self, echo_hello_result):
         """Test capturing output from a real command."""
-        handler = SubprocessHandler(timeout=5)
-        stdout, stderr, returncode = handler.run_command(ECHO_CMD)
+        stdout, stderr, returncode = echo_hello_result
 
         assert "hello" in stdout
         assert stderr == ""
@@ -1478,12 +2114,7 @@ class TestIntegration:
         assert returncode == 0
 
         # Test working directory
-        if sys.platform == "win32":
-            cmd = ["cmd", "/c", "dir"]
-        else:
-            cmd = ["ls"]
-
-        stdout, stderr, returncode = secure.run_command(cmd)
+        stdout, stderr, returncode = secure.run_command(LIST_DIR_CMD)
         assert "test_file.txt" in stdout
         assert returncode == 0
 
@@ -1495,6 +2126,77 @@ class TestIntegration:
         with pytest.raises(ValueError, match="Command not allowed"):
             secure.run_command(ECHO_CMD)
 
+    def test_timeout_with_descendant_holding_pipe(self, tmp_path):
+        """Test a timeout returns promptly while a descendant keeps the pipe open."""
+        script = tmp_path / "spawn.py"
+        script.write_text(
+            "import subprocess, sys, time\n"
+            "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])\n"
+            "time.sleep(5)\n"
+        )
+        secure = SecureSubprocess(SubprocessConfig(timeout=1, termination_wait=0.1))
+
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            secure.run_command([sys.executable, str(script)])
+
+        assert time.monotonic() - start < 4
+
+    @pytest.mark.parametrize("drain", ["_drain_with_selector", "_drain_with_threads"])
+    @pytest.mark.skipif(sys.platform == "win32", reason="Selectors need POSIX pipes")
+    def test_drain_caps_both_streams(self, drain):
+        """Test both drain strategies read each pipe to EOF but keep only the cap."""
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys; sys.stdout.write('o' * 200000); sys.stderr.write('err')",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        secure = SecureSubprocess(SubprocessConfig())
+
+        stdout, stderr = getattr(secure, drain)(
+            process, 10, time.monotonic() + 10, 1001
+        )
+        process.wait()
+
+        assert stdout == b"o" * 1001
+        assert stderr == b"err"
+
+    @pytest.mark.parametrize("drain", ["_drain_with_selector", "_drain_with_threads"])
+    @pytest.mark.skipif(sys.platform == "win32", reason="Selectors need POSIX pipes")
+    def test_drain_closes_pipe_at_limit(self, drain):
+        """Test close_at_limit stops an endless writer once the cap is reached."""
+        process = subprocess.Popen(
+            [sys.executable, "-c", "while True: print('o' * 1000)"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        secure = SecureSubprocess(SubprocessConfig())
+
+        stdout, stderr = getattr(secure, drain)(
+            process, 10, time.monotonic() + 10, 1001, True
+        )
+        returncode = process.wait(timeout=10)
+        process.stderr.close()
+
+        assert stdout == b"o" * 1000 + b"\n"
+        assert returncode != 0  # The writer died on the closed pipe
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="Selectors need POSIX pipes")
+    def test_run_command_closes_pipes_at_limit(self):
+        """Test close_pipes_at_limit truncates an endless command without a timeout."""
+        secure = SecureSubprocess(
+            SubprocessConfig(timeout=5, max_output_size=100, close_pipes_at_limit=True)
+        )
+
+        stdout, _, returncode = secure.run_command(["yes"])
+
+        assert stdout.endswith(secure._TRUNC_SUFFIX)
+        assert returncode != 0
+
 
 # Tests for FileChange class
 class TestFileChange:
@@ -1537,70 +2239,99 @@ class TestFileChange:
         assert file_change.diff_lines == 1
         assert file_change.last_modified == 0
 
+    def test_initialization_stats_once(self, tmp_path):
+        """Test that FileChange reads existence and mtime from a single stat."""
+        test_file = tmp_path / "file.txt"
+        test_file.write_text("test content")
+
+        with patch("os.stat", wraps=os.stat) as mock_stat:
+            file_change = FileChange(path=test_file, status="M", diff="")
+
+        mock_stat.assert_called_once()
+        assert file_change.last_modified == test_file.stat().st_mtime
+
+    def test_diff_lines_ignores_surrounding_whitespace(self):
+        """Test that diff_lines counts lines of the stripped diff."""
+        path = Path("missing.txt")
+
+        assert FileChange(path=path, status="M", diff="").diff_lines == 0
+        assert FileChange(path=path, status="M", diff="\n \n").diff_lines == 0
+        assert FileChange(path=path, status="M", diff="+ a\n").diff_lines == 1
+        assert FileChange(path=path, status="M", diff="+ a\r\n- b\r\n").diff_lines == 2
+
+    def test_uses_slots(self):
+        """Test that FileChange instances carry no per-instance __dict__."""
+        file_change = FileChange(path=Path("missing.txt"), status="M", diff="")
+
+        assert not hasattr(file_change, "__dict__")
+        with pytest.raises(AttributeError):
+            file_change.extra = "value"
+
 
 # Tests for edge cases and additional coverage
 class TestEdgeCases:
     """Test edge cases and additional code paths for coverage."""
 
-    def test_unicode_decode_error_fallback(self, tmp_path, subprocess_handler):
-        """Test that run_command falls back to binary mode on UnicodeDecodeError."""
-        with patch.object(subprocess_handler, "run_text_mode") as mock_text_mode:
-            # Configure mock to raise UnicodeDecodeError
-            mock_text_mode.side_effect = UnicodeDecodeError(
-                "utf-8", b"\x80\x81", 0, 1, "invalid start byte"
-            )
+    def test_run_command_runs_once(self, subprocess_handler):
+        """Test that run_command executes the command once, in text mode."""
+        mock_text_mode = MagicMock(return_value=("text output", "text error", 0))
+        mock_binary_mode = MagicMock()
+        with patch.multiple(
+                subprocess_handler,
+                run_text_mode=mock_text_mode,
+                run_binary_mode=mock_binary_mode,
+        ):
+            stdout, stderr, returncode = subprocess_handler.run_command(ECHO_CMD)
 
-            # Patch run_binary_mode to return a known value
-            with patch.object(
-                    subprocess_handler, "run_binary_mode"
-            ) as mock_binary_mode:
-                mock_binary_mode.return_value = ("binary output", "binary error", 0)
+        mock_text_mode.assert_called_once_with(ECHO_CMD, "utf-8", "replace", None)
+        mock_binary_mode.assert_not_called()
+        assert (stdout, stderr, returncode) == ("text output", "text error", 0)
 
-                # Call run_command
-                stdout, stderr, returncode = subprocess_handler.run_command(ECHO_CMD)
+    def test_run_command_replaces_invalid_utf8(self, subprocess_handler, tmp_path):
+        """Test that invalid UTF-8 output is replaced rather than re-run."""
+        script = tmp_path / "emit.py"
+        script.write_text("import sys; sys.stdout.buffer.write(b'ok \\xff\\n')")
+
+        stdout, _, returncode = subprocess_handler.run_command(
+            [sys.executable, str(script)]
+        )
 
-                # Verify fallback was used
-                mock_text_mode.assert_called_once()
-                mock_binary_mode.assert_called_once()
-                assert stdout == "binary output"
-                assert stderr == "binary error"
-                assert returncode == 0
+        assert stdout == "ok \ufffd\n"
+        assert returncode == 0
 
     def test_execute_subprocess_fallback_return(self, subprocess_handler):
         """Test the fallback return path in _execute_subprocess."""
         # Create a mocked command that will trigger exceptions in _execute_subprocess
-        with patch.object(subprocess_handler, "_start_process") as mock_start:
-            # Mock process setup
-            mock_process = MagicMock()
-            mock_process.communicate.side_effect = Exception("Unexpected error")
-            mock_start.return_value = mock_process
+        # Mock process setup
+        mock_process = MagicMock()
+        mock_process.communicate.side_effect = Exception("Unexpected error")
 
-            # Patch _handle_execution_error to not raise
-            with patch.object(
-                    subprocess_handler, "_handle_execution_error"
-            ) as mock_handle:
-                mock_handle.return_value = None  # Don't raise an exception
-
-                # Create params object for _execute_subprocess
-                params = SubprocessExecutionParams(
-                    command=["test"],
-                    popen_kwargs={},
-                    timeout=None,
-                    is_text_mode=True,
-                    encoding="utf-8",
-                    errors="replace"
-                )
+        # Patch _handle_execution_error to not raise an exception
+        with patch.multiple(
+                subprocess_handler,
+                _start_process=MagicMock(return_value=mock_process),
+                _handle_execution_error=MagicMock(return_value=None),
+        ):
+            # Create params object for _execute_subprocess
+            params = SubprocessExecutionParams(
+                command=["test"],
+                popen_kwargs={},
+                timeout=None,
+                is_text_mode=True,
+                encoding="utf-8",
+                errors="replace"
+            )
 
-                # Call _execute_subprocess with the params object
-                stdout, stderr, returncode = subprocess_handler._execute_subprocess(params)
+            # Call _execute_subprocess with the params object
+            stdout, stderr, returncode = subprocess_handler._execute_subprocess(params)
 
-                # Verify fallback return values
-                assert stdout == ""
-                assert stderr == ""
-                assert returncode == -1
+            # Verify fallback return values
+            assert stdout == ""
+            assert stderr == ""
+            assert returncode == -1
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_resource_monitor_immediate_termination(self, mock_process):
+    @requires_psutil
+    def test_resource_monitor_immediate_termination(self, mock_process, psutil_process):
         """Test ProcessResourceMonitor with immediate process termination."""
         # Setup a terminate callback
         terminate_callback = MagicMock()
@@ -1617,21 +2348,14 @@ class TestEdgeCases:
         # Configure process to be terminated after first poll
         mock_process.poll.side_effect = [None, 0]  # First None, then 0 (terminated)
 
-        # Create a mock psutil.Process
-        mock_psutil_process = MagicMock()
-        # Configure cpu_percent to return a float
-        mock_psutil_process.cpu_percent.return_value = 5.0
-        # Configure memory_info to return a mock with an integer rss attribute
-        mock_psutil_process.memory_info.return_value = MagicMock(rss=512 * 1024)
-
         # Monitor the process tree
-        monitor._monitor_process_tree(mock_psutil_process)
+        monitor._monitor_process_tree(psutil_process)
 
         # Verify terminate callback was not called
         terminate_callback.assert_not_called()
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_cpu_limit_exceeded(self, mock_process):
+    @requires_psutil
+    def test_cpu_limit_exceeded(self, mock_process, psutil_process):
         """Test ProcessResourceMonitor when CPU limit is exceeded."""
         # Setup a terminate callback
         terminate_callback = MagicMock()
@@ -1645,22 +2369,17 @@ class TestEdgeCases:
             terminate_callback=terminate_callback,
         )
 
-        # Create a mock psutil.Process
-        mock_psutil_process = MagicMock()
-        mock_psutil_process.cpu_percent.return_value = (
-            90.0  # 90% CPU usage (exceeds limit)
-        )
-
-        # Check CPU limit
+        # Check CPU limit with 90% CPU usage (exceeds limit)
         assert (
-                monitor._check_cpu_limit(mock_psutil_process, mock_psutil_process) is True
+                monitor._check_cpu_limit(psutil_process, psutil_process, 90.0)
+                is True
         )
 
         # Verify terminate callback was called
-        terminate_callback.assert_called_once_with(mock_psutil_process)
+        terminate_callback.assert_called_once_with(psutil_process)
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
-    def test_memory_limit_exceeded(self, mock_process):
+    @requires_psutil
+    def test_memory_limit_exceeded(self, mock_process, psutil_process):
         """Test ProcessResourceMonitor when memory limit is exceeded."""
         # Setup a terminate callback
         terminate_callback = MagicMock()
@@ -1674,25 +2393,23 @@ class TestEdgeCases:
             terminate_callback=terminate_callback,
         )
 
-        # Create a mock psutil.Process with high memory usage
-        mock_psutil_process = MagicMock()
-        mock_psutil_process.memory_info.return_value = MagicMock(
-            rss=2 * 1024 * 1024
-        )  # 2MB (exceeds limit)
-
-        # Check memory limit
+        # Check memory limit with 2MB memory usage (exceeds limit)
         assert (
-                monitor._check_memory_limit(mock_psutil_process, mock_psutil_process)
+                monitor._check_memory_limit(
+                    psutil_process, psutil_process, 2 * 1024 * 1024
+                )
                 is True
         )
 
         # Verify terminate callback was called
-        terminate_callback.assert_called_once_with(mock_psutil_process)
+        terminate_callback.assert_called_once_with(psutil_process)
 
-    def test_secure_subprocess_truncation_disabled(self, secure_subprocess):
+    def test_secure_subprocess_truncation_disabled(
+            self, secure_subprocess, monkeypatch
+    ):
         """Test SecureSubprocess with truncation disabled."""
         # Set very large max output size
-        secure_subprocess.max_output_size = sys.maxsize
+        monkeypatch.setattr(secure_subprocess, "max_output_size", sys.maxsize)
 
         # Test with string that normally would be truncated
         output = "This is a long string that should not be truncated"
@@ -1723,15 +2440,24 @@ class TestEdgeCases:
             assert stderr == "custom error"
             assert returncode == 123
 
-    def test_prepare_command_invalid(self, secure_subprocess):
+    def test_prepare_command_invalid(self, secure_subprocess, monkeypatch):
         """Test _prepare_command with invalid command."""
         # Set allowed commands
-        secure_subprocess.allowed_commands = {"allowed_command"}
+        monkeypatch.setattr(secure_subprocess, "allowed_commands", {"allowed_command"})
 
         # Test with invalid command
         with pytest.raises(ValueError, match="Command not allowed"):
             secure_subprocess._prepare_command(["invalid_command"])
 
+        # Each denial raises its own exception, and an empty command is denied too
+        with pytest.raises(ValueError) as first:
+            secure_subprocess._prepare_command(["invalid_command"])
+        with pytest.raises(ValueError) as second:
+            secure_subprocess._prepare_command(["invalid_command"])
+        assert first.value is not second.value
+        with pytest.raises(ValueError, match="Command not allowed"):
+            secure_subprocess._prepare_command([])
+
     def test_secure_subprocess_termination_handler(
             self, secure_subprocess, mock_process
     ):
@@ -1776,7 +2502,7 @@ class TestEdgeCases:
             # Check that the command was sanitized and returned
             assert result == ECHO_CMD
 
-    @pytest.mark.skipif(not PSUTIL_AVAILABLE, reason="psutil not available")
+    @requires_psutil
     def test_get_child_processes(self):
         """Test _get_child_processes method."""
         handler = SecureSubprocessTermination()
@@ -1848,10 +2574,27 @@ class FileChangeHandler:
 class ProcessMonitor:
     """Monitor for subprocess execution."""
 
-    def __init__(self, process: subprocess.Popen[Any]) -> None:
+    def __init__(
+            self,
+            process: subprocess.Popen[Any],
+            runner: Callable[[Callable[[], None]], None] | None = None,
+    ) -> None:
+        """Initialize the monitor.
+
+        Args:
+            process: The process to monitor.
+            runner: Callable that runs the monitoring loop; defaults to
+                starting it on a daemon thread.
+        """
         self.process = process
         self._monitoring = False
         self._monitor_thread: threading.Thread | None = None
+        self._runner = runner or self._run_in_thread
+
+    def _run_in_thread(self, fn: Callable[[], None]) -> None:
+        """Run fn on a daemon thread."""
+        self._monitor_thread = threading.Thread(target=fn, daemon=True)
+        self._monitor_thread.start()
 
     def start_monitoring(self) -> None:
         """Start monitoring the process."""
@@ -1859,9 +2602,7 @@ class ProcessMonitor:
             return
 
         self._monitoring = True
-        self._monitor_thread = threading.Thread(target=self._monitor_process)
-        self._monitor_thread.daemon = True
-        self._monitor_thread.start()
+        self._runner(self._monitor_process)
 
     def _monitor_process(self) -> None:
         """Monitor the process until it completes."""